@@ -1,28 +1,57 @@
 """The openwrt integration."""
 from __future__ import annotations
-from async_timeout import timeout
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.core_config import Config
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 from .data_fetcher import DataFetcher
+from .transport import Deadline
+from .retry import RetryPolicy
+from .adaptive import AdaptiveInterval
+from .events import UbusEventListener
+from .fleet import FleetScheduler, get_fleet
+from .refresh import RefreshCoalescer
+from .store import CapabilityStore, SnapshotStore
+from .snapshot import Snapshot
+from .capabilities import async_probe
 from .const import (
     DOMAIN,
     CONF_USERNAME,
     CONF_PASSWD,
     CONF_HOST,
     CONF_UPDATE_INTERVAL,
+    CONF_MEDIUM_INTERVAL,
+    CONF_SLOW_INTERVAL,
+    CONF_ADAPTIVE_INTERVAL,
+    CONF_MIN_INTERVAL,
+    CONF_MAX_INTERVAL,
+    CONF_UBUS_EVENTS,
+    CONF_REFRESH_DEBOUNCE,
+    DEFAULT_REFRESH_DEBOUNCE,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_MAX_INTERVAL,
+    CONF_SSL_FINGERPRINT,
+    CONF_RETRY_ATTEMPTS,
+    CONF_HEDGE_REQUESTS,
+    DEFAULT_RETRY_ATTEMPTS,
     COORDINATOR,
+    FETCHER,
     UNDO_UPDATE_LISTENER,
     REQUEST_TIMEOUT,
+    DEFAULT_VERSION_INFO,
+    DEFAULT_TIER_INTERVALS,
+    TIER_FAST,
+    TIER_MEDIUM,
+    TIER_SLOW,
 )
 from homeassistant.exceptions import ConfigEntryNotReady
+from aiohttp.client_exceptions import ClientError
 
-import time
 import datetime
 import logging
 import asyncio
+import time
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -45,25 +74,85 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     host = entry.data[CONF_HOST]
     username = entry.data[CONF_USERNAME]
     passwd = entry.data[CONF_PASSWD]
-    update_interval_seconds = entry.options.get(CONF_UPDATE_INTERVAL, 10)
-    coordinator = OPENWRTDataUpdateCoordinator(hass, host, username, passwd, update_interval_seconds)
-    await coordinator.async_refresh()
+    # 协调器按 fast 分级的间隔刷新，medium/slow 分级只在到期时加入批量请求
+    tier_intervals = {
+        TIER_FAST: entry.options.get(CONF_UPDATE_INTERVAL, DEFAULT_TIER_INTERVALS[TIER_FAST]),
+        TIER_MEDIUM: entry.options.get(CONF_MEDIUM_INTERVAL, DEFAULT_TIER_INTERVALS[TIER_MEDIUM]),
+        TIER_SLOW: entry.options.get(CONF_SLOW_INTERVAL, DEFAULT_TIER_INTERVALS[TIER_SLOW]),
+    }
+    update_interval_seconds = tier_intervals[TIER_FAST]
+    # 每个路由器只有一个客户端：一个连接池、一次登录，供所有平台共享
+    retry_policy = RetryPolicy(
+        entry.options.get(CONF_RETRY_ATTEMPTS, DEFAULT_RETRY_ATTEMPTS),
+        entry.options.get(CONF_HEDGE_REQUESTS, True),
+    )
+    # 所有路由器共用一个调度器：错开轮询时刻并限制总并发
+    fleet = get_fleet(hass)
+    fleet.register(entry.entry_id)
+    fetcher = DataFetcher(hass, host, username, passwd, entry.options.get(CONF_SSL_FINGERPRINT), retry_policy, tier_intervals, fleet)
+    adaptive = None
+    if entry.options.get(CONF_ADAPTIVE_INTERVAL, False):
+        adaptive = AdaptiveInterval(
+            update_interval_seconds,
+            entry.options.get(CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL),
+            entry.options.get(CONF_MAX_INTERVAL, DEFAULT_MAX_INTERVAL),
+        )
+    coordinator = OPENWRTDataUpdateCoordinator(hass, fetcher, update_interval_seconds, adaptive, fleet, entry.entry_id)
+    coordinator.set_refresh_debounce(entry.options.get(CONF_REFRESH_DEBOUNCE, DEFAULT_REFRESH_DEBOUNCE))
+    store = SnapshotStore(hass, entry.entry_id)
+    coordinator.set_snapshot_store(store)
+    capability_store = CapabilityStore(hass, entry.entry_id)
+    coordinator.set_capability_store(capability_store)
+
+    started = time.monotonic()
+    snapshot = await store.async_load()
+    coordinator.begin_startup(started, snapshot is not None)
+    # 能力按固件缓存；固件变化由轮询中的 system board 发现，之后重新探测
+    capabilities = await capability_store.async_load()
+    if capabilities is not None:
+        fetcher.set_capabilities(capabilities)
+    elif snapshot is None:
+        # 首次启动本来就要等路由器，顺便探测；登录会话留给首次刷新使用
+        if not await coordinator.async_probe_capabilities() and not fetcher.session_stats["valid"]:
+            # 连登录都没有成功：路由器离线，由 HA 稍后重试
+            await _async_abort_setup(entry, fleet, fetcher)
 
-    if not coordinator.last_update_success:
-        raise ConfigEntryNotReady
+    if snapshot is not None:
+        # 实体先用上次保存的数据立即可用（标记为旧数据），首次实时轮询在后台进行
+        fetcher.restore(snapshot)
+        coordinator.async_set_updated_data(snapshot)
+        entry.async_create_background_task(hass, coordinator.async_refresh(), f"openwrt first poll {host}")
+    else:
+        # 启动只做一次登录和一次批量请求（设备信息 + 状态 + 开关），各平台直接使用这次的数据
+        await coordinator.async_refresh()
+
+        if not coordinator.last_update_success:
+            await _async_abort_setup(entry, fleet, fetcher)
+
+    if entry.options.get(CONF_UBUS_EVENTS, False):
+        coordinator.start_events()
 
     undo_listener = entry.add_update_listener(update_listener)
 
     hass.data[DOMAIN][entry.entry_id] = {
         COORDINATOR: coordinator,
+        FETCHER: fetcher,
         UNDO_UPDATE_LISTENER: undo_listener,
     }
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    coordinator.startup_stats["entities_ready"] = round(time.monotonic() - started, 3)
 
     return True
 
 
+async def _async_abort_setup(entry: ConfigEntry, fleet: FleetScheduler, fetcher: DataFetcher):
+    """Release what setup took, then let HA retry the entry later."""
+    fleet.unregister(entry.entry_id)
+    await fetcher.async_close()
+    raise ConfigEntryNotReady
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Unload a config entry."""
     unload_ok = all(
@@ -78,11 +167,20 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     hass.data[DOMAIN][entry.entry_id][UNDO_UPDATE_LISTENER]()
 
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        entry_data = hass.data[DOMAIN].pop(entry.entry_id)
+        await entry_data[COORDINATOR].async_stop_events()
+        await entry_data[FETCHER].async_close()
+        get_fleet(hass).unregister(entry.entry_id)
 
     return unload_ok
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Delete the persisted snapshot and capabilities of a removed entry."""
+    await SnapshotStore(hass, entry.entry_id).async_remove()
+    await CapabilityStore(hass, entry.entry_id).async_remove()
+
+
 async def update_listener(hass: HomeAssistant, entry: ConfigEntry):
     """Update listener."""
     await hass.config_entries.async_reload(entry.entry_id)
@@ -91,79 +189,302 @@ async def update_listener(hass: HomeAssistant, entry: ConfigEntry):
 class OPENWRTDataUpdateCoordinator(DataUpdateCoordinator):
     """Class to manage fetching OPENWRT data."""
 
-    def __init__(self, hass: HomeAssistant, host: str, username: str, passwd: str, update_interval_seconds: int) -> None:
+    def __init__(self, hass: HomeAssistant, fetcher: DataFetcher, update_interval_seconds: int, adaptive: AdaptiveInterval = None, fleet: FleetScheduler = None, entry_id: str = None) -> None:
         """Initialize."""
+        if adaptive is not None:
+            update_interval_seconds = adaptive.interval
         update_interval = datetime.timedelta(seconds=update_interval_seconds)
-        _LOGGER.debug("%s Data will be update every %s", host, update_interval)
-        self._token = ""
-        self._token_expire_time = 0
-        self._allow_login = True
-        self._sw_version = "1.0"
-        self._device_name = "OpenWrt"
-        self._model = "OpenWrt Router"
-
+        _LOGGER.debug("%s Data will be update every %s", fetcher.host, update_interval)
         super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=update_interval)
 
-        self._fetcher = DataFetcher(hass, host, username, passwd)
-        self.host = host
+        self._fetcher = fetcher
+        self._adaptive = adaptive
+        # 目标轮询间隔；实际的 update_interval 还要对齐到 fleet 的时间槽
+        self._interval = update_interval_seconds
+        self._fleet = fleet
+        self._entry_id = entry_id
+        self.host = fetcher.host
+        # 探测到路由器恢复后立即完整刷新一次
+        fetcher.breaker.set_listener(self.async_refresh)
+        self.events = None
+        self.startup_stats = None
+        self._startup_started = None
+        self._store = None
+        self._capability_store = None
+        self._probing = False
+        self._coalescer = RefreshCoalescer(hass, self.async_refresh, DEFAULT_REFRESH_DEBOUNCE)
+        # 上次通知监听者时的 (快照, 是否成功)，用来算出本次变化的键
+        self._dispatched = None
+        self._changed_keys = None
+        self._dispatch_stats = {
+            "updates": 0,
+            "full_updates": 0,
+            "writes": 0,
+            "skipped_writes": 0,
+            "last_changed_keys": [],
+        }
+
+    def set_snapshot_store(self, store: SnapshotStore):
+        """Save every good snapshot to this store."""
+        self._store = store
+
+    def set_capability_store(self, store: CapabilityStore):
+        """Save every capability probe to this store."""
+        self._capability_store = store
+
+    async def async_probe_capabilities(self):
+        """Probe what the router supports, return True if the probe succeeded."""
+        deadline = Deadline(REQUEST_TIMEOUT)
+        try:
+            async with deadline.timeout():
+                sysauth = await self._fetcher.get_access_token(deadline)
+                if sysauth is None:
+                    return False
+                capabilities = await async_probe(self._fetcher, sysauth, self._fetcher.probe_files, deadline)
+        except (ClientError, asyncio.TimeoutError, UpdateFailed) as error:
+            _LOGGER.warning("%s capability probe failed: %s", self.host, error)
+            return False
+        if capabilities is None:
+            return False
+
+        self._fetcher.set_capabilities(capabilities)
+        _LOGGER.debug("%s capabilities: %s", self.host, self._fetcher.capability_stats)
+        if self._capability_store is not None:
+            await self._capability_store.async_save(capabilities)
+        return True
+
+    def _check_capabilities(self):
+        """Re-probe in the background when the firmware differs from the probed one."""
+        firmware = self._fetcher.firmware
+        if self._probing or firmware is None or firmware == self._fetcher.capabilities.firmware:
+            return
+        self._probing = True
+        self.hass.async_create_background_task(self._async_reprobe(firmware), f"openwrt capability probe {self.host}")
+
+    async def _async_reprobe(self, firmware):
+        if not await self.async_probe_capabilities():
+            # 探测失败不反复重试，下次启动再探测
+            return
+        _LOGGER.info("%s firmware is now %s, reloading with its capabilities", self.host, firmware)
+        self._probing = False
+        # 能力决定创建哪些实体，重新加载条目
+        if self._entry_id is not None:
+            self.hass.config_entries.async_schedule_reload(self._entry_id)
+
+    def begin_startup(self, started: float, restored: bool):
+        """Start timing the entry setup, for diagnostics."""
+        self._startup_started = started
+        self.startup_stats = {
+            "restored_snapshot": restored,
+            "entities_ready": None,
+            "first_live_poll": None,
+            "round_trips": None,
+        }
+
+    def _record_good_poll(self, data):
+        """Persist a fresh snapshot and note when the first one arrived."""
+        if self._store is not None:
+            self._store.async_save(data)
+        stats = self.startup_stats
+        if stats is not None and stats["first_live_poll"] is None:
+            stats["first_live_poll"] = round(time.monotonic() - self._startup_started, 3)
+            stats["round_trips"] = self._fetcher.poll_stats["last_poll_round_trips"]
+
+    def set_refresh_debounce(self, debounce: float):
+        """Set the window in which refresh requests are merged."""
+        self._coalescer.debounce = debounce
+
+    @callback
+    def async_add_key_listener(self, keys, update_callback):
+        """Listen for updates that change one of the snapshot keys, return the remover.
+
+        Availability changes and the first update still reach every listener.
+        """
+        keys = frozenset(keys)
 
-    async def get_access_token(self):
-        if time.time() < self._token_expire_time:
-            return self._token
+        @callback
+        def listener():
+            changed = self._changed_keys
+            if changed is None or not keys.isdisjoint(changed):
+                self._dispatch_stats["writes"] += 1
+                update_callback()
+            else:
+                self._dispatch_stats["skipped_writes"] += 1
+
+        return self.async_add_listener(listener)
+
+    @callback
+    def async_update_listeners(self):
+        """Work out which keys changed, then notify the listeners."""
+        previous = self._dispatched
+        self._dispatched = (self.data, self.last_update_success)
+        stats = self._dispatch_stats
+        stats["updates"] += 1
+        if previous is None or previous[1] != self.last_update_success or not isinstance(self.data, Snapshot):
+            # 首次更新或可用性变化：所有实体都要写状态
+            self._changed_keys = None
+            stats["full_updates"] += 1
         else:
-            if self._allow_login == True:
-                self._token = await self._fetcher.login_openwrt()
-                
-                self._token = self._token[0]
-                
-                if self._token == 403 or self._token == 9999:
-                    self._allow_login = False
-                    
-                self._token_expire_time = time.time() + 60*60*2
-                
-                return self._token
+            self._changed_keys = self.data.changed_keys(previous[0])
+            stats["last_changed_keys"] = sorted(self._changed_keys)
+        super().async_update_listeners()
+
+    @property
+    def dispatch_stats(self):
+        """Return how many entity state writes the key diff skipped, for diagnostics."""
+        return dict(self._dispatch_stats)
+
+    @property
+    def refresh_stats(self):
+        """Return how many refresh requests were merged, for diagnostics."""
+        return self._coalescer.stats
+
+    async def async_request_refresh(self):
+        """Request a refresh; requests within the debounce window share one poll."""
+        await self._coalescer.async_request()
+
+    def start_events(self):
+        """Subscribe to ubus events, polling stays as the fallback."""
+        self.events = UbusEventListener(self.hass, self._fetcher, self._handle_event)
+        self.events.start()
+
+    async def async_stop_events(self):
+        """Close the event streams."""
+        if self.events is not None:
+            await self.events.async_stop()
+
+    @callback
+    def _handle_event(self, obj, event, data):
+        """Apply a ubus event to the snapshot, then refresh what it touched."""
+        _LOGGER.debug("ubus event %s %s: %s", obj, event, data)
+        if obj == "network.interface":
+            if event == "interface.down" and self.data:
+                # 接口断开立即反映到快照，不必等下一次轮询；netifd 通知的类型即 SSE 的 event，数据里没有 action
+                key = {"wan": "openwrt_wan", "wan6": "openwrt_wan6"}.get(data.get("interface"))
+                if key is not None:
+                    self.async_set_updated_data(self.data.evolve({key + "_ip": "", key + "_uptime": None}))
+            self._fetcher.refresh_tier(TIER_SLOW)
+        elif obj.startswith("hostapd."):
+            # 无线终端上下线影响在线用户数
+            self._fetcher.refresh_tier(TIER_MEDIUM)
+        else:
+            return
+        self.hass.async_create_task(self.async_request_refresh())
+
+    @property
+    def interval_stats(self):
+        """Return the effective polling interval, for diagnostics."""
+        stats = {
+            "adaptive": self._adaptive is not None,
+            "interval": self._interval,
+            "next_delay": round(self.update_interval.total_seconds(), 3),
+        }
+        if self._adaptive is not None:
+            stats["pressure"] = self._adaptive.pressure
+            stats["timeout_rate"] = self._adaptive.timeout_rate()
+        return stats
+
+    def _adapt(self, data):
+        """Retune update_interval from the last poll; data is None on timeout."""
+        if self._adaptive is None:
+            return
+        timed_out = data is None or data.get("openwrt_isold", False)
+        data = data or {}
+        try:
+            cpu = float(data.get("openwrt_cpu"))
+        except (TypeError, ValueError):
+            cpu = None
+        self._interval = self._adaptive.update(
+            rtt=self._fetcher.poll_stats["last_poll_duration"],
+            cpu=cpu,
+            load=data.get("openwrt_load"),
+            timed_out=timed_out,
+        )
+
+    def _schedule_next(self):
+        """Set update_interval so the next poll lands on this entry's fleet slot."""
+        delay = self._interval
+        if self._fleet is not None:
+            delay = self._fleet.next_delay(self._entry_id, self._interval)
+        # 协调器在本次刷新结束后按新的间隔安排下一次
+        self.update_interval = datetime.timedelta(seconds=delay)
 
     async def _async_update_data(self):
-        """Update data via DataFetcher."""
-        _LOGGER.debug("token_expire_time: %s", self._token_expire_time)
-
-        if self._allow_login == True:
-            sysauth = await self.get_access_token()
-            sysauth = str(sysauth)
-            _LOGGER.debug("sysauth: %s", sysauth)
-
-            if self._sw_version == "1.0":
-                openwrtinfodata = await self._fetcher.get_openwrt_version(sysauth)
-                if openwrtinfodata is not None:  # 只有成功获取数据时才更新
-                    self._sw_version = openwrtinfodata["sw_version"]
-                    self._device_name = openwrtinfodata["device_name"]
-                    self._model = openwrtinfodata["model"]
-                    _LOGGER.debug("OpenWrt Version Info: %s", openwrtinfodata)
-                else:
-                    _LOGGER.warning("Failed to get OpenWrt version info, keeping existing values")
+        """Update data via DataFetcher, then schedule the next poll."""
+        if self._fleet is not None:
+            self._fleet.poll_started(self._entry_id)
+        try:
+            return await self._async_poll()
+        finally:
+            self._schedule_next()
+
+    async def _async_poll(self):
+        """Poll the router once."""
+        # 整个轮询共用一个超时预算，子请求只能使用剩余时间
+        deadline = Deadline(REQUEST_TIMEOUT)
+
+        if not self._fetcher.allow_login:
+            # 登录被拒绝后退避期间不请求路由器，退避结束自动重试
+            raise UpdateFailed("openwrt rejected the login, retrying later")
+
+        breaker = self._fetcher.breaker
+        if breaker.is_open:
+            # 路由器不可达：不登录也不发批量请求，等 TCP 探测成功后再刷新
+            breaker.skip_poll()
+            return self._stale_data("openwrt is unreachable")
+
+        sysauth = await self._fetcher.get_access_token(deadline)
+        if sysauth is None:
+            # 密码被拒绝不是路由器离线，不计入熔断
+            if self._fetcher.allow_login:
+                breaker.record_failure()
+            raise UpdateFailed("failed to login openwrt")
+        _LOGGER.debug("sysauth: %s", sysauth)
+
+        try:
+            async with deadline.timeout():
+                data = await self._fetcher.get_data(sysauth, deadline)
+                _LOGGER.debug("Current Function is _async_update_data, data: %s", data)
                 
-            try:
-                async with timeout(REQUEST_TIMEOUT):
-                    data = await self._fetcher.get_data(sysauth)
-                    _LOGGER.debug("Current Function is _async_update_data, data: %s", data)
-                    
+                if data == 401:
+                    # 会话已失效：等新会话后重试一次，仍失败则沿用旧数据，不清空传感器
+                    self._fetcher.invalidate_token()
+                    sysauth = await self._fetcher.get_access_token(deadline)
+                    data = await self._fetcher.get_data(sysauth, deadline) if sysauth is not None else 401
                     if data == 401:
-                        self._token_expire_time = 0
-                        return {}
-                    
-                    if not data:
-                        _LOGGER.error("failed in getting data")
-                        raise UpdateFailed("failed in getting data")
-                    
-                    data["sw_version"] = self._sw_version
-                    data["device_name"] = self._device_name
-                    data["model"] = self._model
-                    return data
+                        return self._stale_data("openwrt session expired")
                 
-            except asyncio.TimeoutError:
-                _LOGGER.error("Timeout fetching _async_update_data data (timeout=%ds)", REQUEST_TIMEOUT)
+                if not data:
+                    _LOGGER.error("failed in getting data")
+                    raise UpdateFailed("failed in getting data")
                 
-            except Exception as error:
-                raise UpdateFailed(error) from error
-        # 若不允许登录，返回空字典
-        return {}
+                # 设备信息和状态在同一个批量请求中获取；还没拿到时用默认值
+                if data.board.sw_version is None:
+                    data = data.evolve(DEFAULT_VERSION_INFO)
+                if data.get("openwrt_isold"):
+                    breaker.record_failure()
+                    if not self.data:
+                        # 还没有任何可用数据（也没有保存的快照），不用占位数据冒充
+                        raise UpdateFailed("no data from openwrt yet")
+                else:
+                    breaker.record_success()
+                    self._record_good_poll(data)
+                    self._check_capabilities()
+                self._adapt(data)
+                return data.evolve({"openwrt_poll_interval": round(self._interval, 1)})
+            
+        except asyncio.TimeoutError:
+            _LOGGER.error("Timeout fetching _async_update_data data (timeout=%ds)", deadline.budget)
+            breaker.record_failure()
+            self._adapt(None)
+            # 协调器的超时可能先于 get_data 内部的超时触发，同样沿用旧数据，不能返回空快照
+            return self._stale_data("timeout fetching openwrt data")
+            
+        except Exception as error:
+            raise UpdateFailed(error) from error
+
+    def _stale_data(self, reason):
+        """Return the current data marked as old, or raise UpdateFailed if there is none."""
+        if not self.data:
+            raise UpdateFailed(reason)
+        return self.data.evolve({"openwrt_isold": True})
@@ -0,0 +1,76 @@
+"""
+adaptive polling interval from router latency, load and timeouts
+"""
+
+import logging
+from collections import deque
+
+_LOGGER = logging.getLogger(__name__)
+
+# 超过这些值认为路由器压力大，需要放慢轮询
+CPU_HIGH = 80.0
+LOAD_HIGH = 2.0
+RTT_HIGH = 2.0
+TIMEOUT_RATE_HIGH = 0.2
+# 压力低于这个比例时才加快
+PRESSURE_LOW = 0.5
+# 超时率统计最近的轮询次数
+OUTCOME_WINDOW = 10
+
+
+class AdaptiveInterval:
+    """Stretch the polling interval under pressure, shrink it when idle.
+
+    Pressure is the worst of CPU, 1-min load, smoothed poll round-trip time
+    and recent timeout rate, each relative to its "high" threshold. Above 1
+    the interval grows by half; below PRESSURE_LOW it shrinks by a tenth,
+    always within [min_interval, max_interval].
+    """
+
+    def __init__(self, interval: float, min_interval: float, max_interval: float) -> None:
+        self._min = min_interval
+        self._max = max(min_interval, max_interval)
+        self._interval = self._clamp(interval)
+        self._rtt = None
+        self._outcomes = deque(maxlen=OUTCOME_WINDOW)
+        self.pressure = 0.0
+
+    @property
+    def interval(self) -> float:
+        """Return the current interval in seconds."""
+        return self._interval
+
+    def _clamp(self, interval):
+        return min(self._max, max(self._min, interval))
+
+    def timeout_rate(self) -> float:
+        """Return the share of recent polls that timed out or failed."""
+        if not self._outcomes:
+            return 0.0
+        return sum(self._outcomes) / len(self._outcomes)
+
+    def update(self, rtt=None, cpu=None, load=None, timed_out=False) -> float:
+        """Feed one poll's measurements, return the new interval."""
+        self._outcomes.append(1 if timed_out else 0)
+        if rtt is not None and not timed_out:
+            # 指数平滑，避免单次抖动改变间隔
+            self._rtt = rtt if self._rtt is None else 0.7 * self._rtt + 0.3 * rtt
+
+        pressures = [self.timeout_rate() / TIMEOUT_RATE_HIGH]
+        if self._rtt is not None:
+            pressures.append(self._rtt / RTT_HIGH)
+        if cpu is not None:
+            pressures.append(cpu / CPU_HIGH)
+        if load is not None:
+            pressures.append(load / LOAD_HIGH)
+        self.pressure = round(max(pressures), 3)
+
+        previous = self._interval
+        if self.pressure > 1:
+            self._interval = self._clamp(self._interval * 1.5)
+        elif self.pressure < PRESSURE_LOW:
+            self._interval = self._clamp(self._interval * 0.9)
+
+        if round(previous) != round(self._interval):
+            _LOGGER.debug("poll interval %.1fs -> %.1fs (pressure %s)", previous, self._interval, self.pressure)
+        return self._interval
@@ -0,0 +1,134 @@
+"""
+circuit breaker with a cheap tcp liveness probe for one router
+"""
+
+import asyncio
+import logging
+from urllib.parse import urlparse
+
+from async_timeout import timeout
+
+from .const import (
+    BREAKER_FAILURES,
+    BREAKER_PROBE_MAX,
+    BREAKER_PROBE_MIN,
+    BREAKER_PROBE_TIMEOUT,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stop full polls while the router is unreachable.
+
+    After BREAKER_FAILURES failed polls in a row the breaker opens: polls
+    are skipped and a background task only tries a TCP connect to the
+    router's web port, every 1, 2, 4... seconds up to BREAKER_PROBE_MAX.
+    Once the port answers the breaker goes half-open and calls the
+    recovery listener, so the next full poll runs right away; its result
+    closes or re-opens the breaker.
+    """
+
+    def __init__(self, hass, host: str, failure_threshold: int = BREAKER_FAILURES) -> None:
+        self._hass = hass
+        url = urlparse(host)
+        self._probe_host = url.hostname
+        self._probe_port = url.port or (443 if url.scheme == "https" else 80)
+        self._failure_threshold = failure_threshold
+        self._failures = 0
+        self._state = STATE_CLOSED
+        self._probe_task = None
+        self._listener = None
+        self._stats = {"opened": 0, "probes": 0, "skipped_polls": 0}
+
+    @property
+    def state(self) -> str:
+        """Return closed, open or half_open."""
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """Return True while polls should be skipped."""
+        return self._state == STATE_OPEN
+
+    @property
+    def stats(self):
+        """Return breaker state and counters, for diagnostics."""
+        stats = dict(self._stats)
+        stats["state"] = self._state
+        stats["consecutive_failures"] = self._failures
+        return stats
+
+    def set_listener(self, listener):
+        """Set the callback run when a probe sees the router again."""
+        self._listener = listener
+
+    def skip_poll(self):
+        """Count a poll skipped because the breaker is open."""
+        self._stats["skipped_polls"] += 1
+
+    def record_success(self):
+        """Close the breaker after a good poll."""
+        if self._state != STATE_CLOSED:
+            _LOGGER.info("%s is back online", self._probe_host)
+        self._failures = 0
+        self._state = STATE_CLOSED
+        self._stop_probe()
+
+    def record_failure(self):
+        """Count a failed poll, opening the breaker past the threshold."""
+        self._failures += 1
+        if self._state == STATE_HALF_OPEN or self._failures >= self._failure_threshold:
+            self._open()
+
+    def _open(self):
+        if self._state != STATE_OPEN:
+            _LOGGER.warning("%s unreachable after %d failed polls, pausing polling", self._probe_host, self._failures)
+            self._stats["opened"] += 1
+        self._state = STATE_OPEN
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = self._hass.async_create_background_task(
+                self._async_probe_loop(), f"openwrt probe {self._probe_host}"
+            )
+
+    def _stop_probe(self):
+        if self._probe_task is not None and not self._probe_task.done():
+            self._probe_task.cancel()
+        self._probe_task = None
+
+    async def async_probe(self) -> bool:
+        """Return True if the router's web port accepts a TCP connection."""
+        self._stats["probes"] += 1
+        try:
+            async with timeout(BREAKER_PROBE_TIMEOUT):
+                _, writer = await asyncio.open_connection(self._probe_host, self._probe_port)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True
+
+    async def _async_probe_loop(self):
+        delay = BREAKER_PROBE_MIN
+        while self._state == STATE_OPEN:
+            await asyncio.sleep(delay)
+            if await self.async_probe():
+                _LOGGER.debug("%s answers the probe, retrying a full poll", self._probe_host)
+                self._state = STATE_HALF_OPEN
+                # 探测任务到此结束；若这次轮询又失败，会重新开始探测
+                self._probe_task = None
+                if self._listener is not None:
+                    self._hass.async_create_task(self._listener())
+                return
+            delay = min(delay * 2, BREAKER_PROBE_MAX)
+
+    def stop(self):
+        """Cancel probing, on unload."""
+        self._stop_probe()
@@ -1,13 +1,9 @@
 """OPENWRT Entities"""
 import logging
-import time
 import datetime
 import re
-import requests
-import json
 import asyncio
-from async_timeout import timeout
-from aiohttp.client_exceptions import ClientConnectorError
+from aiohttp.client_exceptions import ClientError
 from homeassistant.components.button import ButtonEntity
 from homeassistant.core import HomeAssistant
 from homeassistant.config_entries import ConfigEntry
@@ -18,13 +14,13 @@ from .const import (
     DOMAIN,
     BUTTON_TYPES,
     CONF_HOST,
-    CONF_USERNAME,
-    CONF_PASSWD,
     DO_URL,
-    REQUEST_TIMEOUT,
+    FETCHER,
+    UBUS_URL,
+    PRIORITY_USER,
 )
-
-from .data_fetcher import DataFetcher
+from .transport import Deadline
+from .ubus import UbusBatch
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -33,13 +29,12 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
     """Add bjtoon_health_code entities from a config_entry."""
 
     coordinator = hass.data[DOMAIN][config_entry.entry_id][COORDINATOR]
+    fetcher = hass.data[DOMAIN][config_entry.entry_id][FETCHER]
     host = config_entry.data[CONF_HOST]
-    username = config_entry.data[CONF_USERNAME]
-    passwd = config_entry.data[CONF_PASSWD]
 
     buttons = []
     for button in BUTTON_TYPES:
-        buttons.append(OPENWRTButton(hass, button, coordinator, host, username, passwd))
+        buttons.append(OPENWRTButton(hass, button, coordinator, fetcher, host))
 
     async_add_entities(buttons, False)
 
@@ -48,7 +43,7 @@ class OPENWRTButton(ButtonEntity):
     """Define an bjtoon_health_code entity."""
     _attr_has_entity_name = True
 
-    def __init__(self, hass: HomeAssistant, kind, coordinator, host, username, passwd) -> None:
+    def __init__(self, hass: HomeAssistant, kind, coordinator, fetcher, host) -> None:
         """Initialize."""
         super().__init__()
         self.kind = kind
@@ -65,27 +60,10 @@ class OPENWRTButton(ButtonEntity):
         self._attr_device_class = "restart"
         self._attr_entity_registry_enabled_default = True
         self._hass = hass
-        self._token = ""
-        self._token_expire_time = 0
-        self._allow_login = True
-        self._fetcher = DataFetcher(hass, host, username, passwd)
+        self._fetcher = fetcher
         self._host = host
         self._data = ""
 
-    async def get_access_token(self):
-        if time.time() < self._token_expire_time:
-            return self._token
-        else:
-            if self._allow_login == True:
-                self._token = await self._fetcher.login_openwrt()
-                self._token = self._token[0]
-                
-                if self._token == 403 or self._token == 9999:
-                    self._allow_login = False
-                    
-                self._token_expire_time = time.time() + 60*60*2
-                return self._token
-
     @property
     def name(self):
         """Return the name."""
@@ -117,12 +95,9 @@ class OPENWRTButton(ButtonEntity):
         data = self.coordinator.data  # 先获取数据引用
         # 检查数据是否为None，避免空指针错误
         if data is not None:
-            # 安全获取属性数据
+            # 快照中的属性只读且与协调器共享，复制一份交给 HA；querytime 每次轮询都变，不作为属性
             if data.get(self.kind + "_attrs"):
-                attrs = data[self.kind + "_attrs"]
-            # 安全获取querytime（即使不存在也不会报错）
-            if "querytime" in data:
-                attrs["querytime"] = data["querytime"]
+                attrs = dict(data[self.kind + "_attrs"])
         return attrs
 
     def press(self) -> None:
@@ -134,61 +109,55 @@ class OPENWRTButton(ButtonEntity):
 
     async def async_added_to_hass(self):
         """Connect to dispatcher listening for entity data notifications."""
-        self.async_on_remove(self.coordinator.async_add_listener(self.async_write_ha_state))
+        # 按钮只显示自己的属性，其余更新只在可用性变化时需要写状态
+        self.async_on_remove(self.coordinator.async_add_key_listener((self.kind + "_attrs",), self.async_write_ha_state))
 
     async def async_update(self):
         """Update Bjtoon health code entity."""
         # await self.coordinator.async_request_refresh()
 
-    def requestpost_data(self, url, headerstr, datastr):
-        responsedata = requests.post(url, headers=headerstr, data=datastr, verify=False, allow_redirects=False)
-        if responsedata.status_code != 200:
-            return responsedata.status_code
-        _LOGGER.debug(responsedata)
-        return responsedata
-
-    def requestget_data_text(self, url, headerstr):
-        responsedata = requests.get(url, headers=headerstr)
-        if responsedata.status_code != 200:
-            return responsedata.status_code
-        resdata = responsedata.content.decode('utf-8')
-        return resdata
-
-    def requestpost_json2(self, url, headerstr, json_body):
-        responsedata = requests.post(url, headers=headerstr, data=json_body, verify=False)
-        if responsedata.status_code != 200:
-            return responsedata.status_code
-        json_text = responsedata.content.decode('utf-8')
-        resdata = json.loads(json_text)
+    async def requestpost_data(self, url, headerstr, datastr, deadline=None):
+        status, body = await self._fetcher.async_request("POST", url, headerstr, deadline=deadline, data=datastr, allow_redirects=False)
+        if status != 200:
+            return status
+        _LOGGER.debug(body)
+        return body
+
+    async def requestget_data_text(self, url, headerstr, deadline=None):
+        status, body = await self._fetcher.async_request("GET", url, headerstr, deadline=deadline)
+        if status != 200:
+            return status
+        resdata = body.decode('utf-8')
         return resdata
 
     async def _openwrt_action(self, action):
-        if self._allow_login == True:
-            sysauth = await self.get_access_token()
+        if self._fetcher.allow_login == True:
+            deadline = Deadline(priority=PRIORITY_USER)
+            sysauth = await self._fetcher.get_access_token(deadline)
+            if sysauth is None:
+                _LOGGER.error("Current function _openwrt_action, login failed")
+                return
 
             if action == "restart":
-                body = '[{"jsonrpc":"2.0","id":3,"method":"call","params":["' + sysauth + '","system","reboot",{}]}]'
-
-                header = {
-                    "Content-Type": "application/json",
-                    "Content-Length": str(len(body))
-                }
+                batch = UbusBatch()
+                batch.add("system", "reboot")
 
-                url = self._host + "/ubus/"
+                url = self._host + UBUS_URL
                 try:
-                    async with timeout(REQUEST_TIMEOUT):
-                        resdata = await self._hass.async_add_executor_job(self.requestpost_json2, url, header, body)
+                    async with deadline.timeout():
+                        resdata = await self._fetcher.async_call_batch(batch, sysauth, deadline, "reboot")
 
-                except (ClientConnectorError) as error:
+                except ClientError as error:
                     raise UpdateFailed(error)
                 
                 except asyncio.TimeoutError:
-                    _LOGGER.error("Timeout fetching _openwrt_action data (timeout=%ds)", REQUEST_TIMEOUT)
+                    _LOGGER.error("Timeout fetching _openwrt_action data (timeout=%ds)", deadline.budget)
                     
                 _LOGGER.debug("Requests remaining: %s", url)
                 
                 if resdata == 401 or resdata == 403:
                     self._data = 401
+                    self._fetcher.invalidate_token()
                     return
 
         self._state = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -196,10 +165,11 @@ class OPENWRTButton(ButtonEntity):
         return "OK"
 
     async def _openwrt_action_Bak(self, action):
-        if self._allow_login == True:
+        if self._fetcher.allow_login == True:
             body = "token={{token}}&_=0.7647894831805453"
             contenttype = "application/x-www-form-urlencoded"
-            sysauth = await self.get_access_token()
+            deadline = Deadline(priority=PRIORITY_USER)
+            sysauth = await self._fetcher.get_access_token(deadline)
 
             header = {
                 "Cookie": "sysauth=" + sysauth
@@ -219,14 +189,14 @@ class OPENWRTButton(ButtonEntity):
 
             url = self._host + DO_URL + parameter1
             try:
-                async with timeout(REQUEST_TIMEOUT):
-                    resdata = await self._hass.async_add_executor_job(self.requestget_data_text, url, header)
+                async with deadline.timeout():
+                    resdata = await self.requestget_data_text(url, header, deadline)
                     
-            except (ClientConnectorError) as error:
+            except ClientError as error:
                 raise UpdateFailed(error)
             
             except asyncio.TimeoutError:
-                _LOGGER.error("Timeout fetching _openwrt_action data (timeout=%ds)", REQUEST_TIMEOUT)
+                _LOGGER.error("Timeout fetching _openwrt_action data (timeout=%ds)", deadline.budget)
                 
             _LOGGER.debug("Requests remaining: %s", url)
             # _LOGGER.debug(resdata)
@@ -265,14 +235,14 @@ class OPENWRTButton(ButtonEntity):
             _LOGGER.debug(body)
             
             try:
-                async with timeout(REQUEST_TIMEOUT):
-                    resdata = await self._hass.async_add_executor_job(self.requestpost_data, url, header, body)
+                async with deadline.timeout():
+                    resdata = await self.requestpost_data(url, header, body, deadline)
                     
-            except (ClientConnectorError) as error:
+            except ClientError as error:
                 raise UpdateFailed(error)
             
             except asyncio.TimeoutError:
-                _LOGGER.error("Timeout fetching _openwrt_action data (timeout=%ds)", REQUEST_TIMEOUT)
+                _LOGGER.error("Timeout fetching _openwrt_action data (timeout=%ds)", deadline.budget)
                 
             _LOGGER.debug("Requests remaining: %s", url)
             _LOGGER.debug(resdata)
@@ -0,0 +1,95 @@
+"""
+ttl cache for ubus call results, shared by every platform of one router
+"""
+
+import time
+from collections import OrderedDict
+
+from .const import (
+    BOARD_CACHE_TTL,
+    CACHE_MAX_ENTRIES,
+    UCI_CACHE_TTL,
+)
+
+# 每种调用结果的缓存时间（秒），不在表里的调用不缓存
+# system board 只会在刷机后变化；刷机或重启可能不经过本集成，因此不能永久缓存
+CACHE_TTL = {
+    ("system", "board"): BOARD_CACHE_TTL,
+    ("uci", "get"): UCI_CACHE_TTL,
+}
+
+# 修改 uci 配置的调用，成功后作废该配置的缓存
+UCI_WRITES = {"set", "add", "delete", "rename", "reorder", "revert", "commit"}
+# 之后所有缓存都不可信的调用
+CLEAR_ALL = {("system", "reboot"), ("uci", "apply"), ("uci", "rollback")}
+
+
+class UbusCache:
+    """Bounded LRU cache of UbusResult keyed by (object, method, params)."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES) -> None:
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    @property
+    def stats(self):
+        """Return hit/miss counters, for diagnostics."""
+        stats = dict(self._stats)
+        stats["size"] = len(self._entries)
+        return stats
+
+    @staticmethod
+    def key(call):
+        """Return the cache key of a call; params are compared by value."""
+        return call.object, call.method, repr(sorted(call.params.items()))
+
+    @staticmethod
+    def cacheable(call) -> bool:
+        """Return True if results of this call may be cached."""
+        return (call.object, call.method) in CACHE_TTL
+
+    def get(self, call):
+        """Return the cached UbusResult of a call, or None."""
+        if not self.cacheable(call):
+            return None
+        key = self.key(call)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        return entry[1]
+
+    def put(self, call, result):
+        """Cache a successful result for the TTL of its call."""
+        if not result.ok or not self.cacheable(call):
+            return
+        key = self.key(call)
+        expires = time.monotonic() + CACHE_TTL[(call.object, call.method)]
+        self._entries[key] = (expires, result, call.params.get("config"))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def invalidate(self, call):
+        """Drop the entries a write call makes stale."""
+        if (call.object, call.method) in CLEAR_ALL:
+            self.clear()
+        elif call.object == "uci" and call.method in UCI_WRITES:
+            self.invalidate_config(call.params.get("config"))
+
+    def invalidate_config(self, config):
+        """Drop every cached uci read of one config."""
+        for key in [key for key, entry in self._entries.items() if key[0] == "uci" and entry[2] == config]:
+            del self._entries[key]
+            self._stats["invalidations"] += 1
+
+    def clear(self):
+        """Drop everything."""
+        self._stats["invalidations"] += len(self._entries)
+        self._entries.clear()
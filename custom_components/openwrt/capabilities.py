@@ -0,0 +1,117 @@
+"""
+what one router firmware supports: ubus methods, readable files, uci configs
+"""
+
+import logging
+
+from .ubus import UbusBatch
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def firmware_id(board: dict) -> str:
+    """Return a string that changes whenever the router is flashed."""
+    release = board.get("release") or {}
+    return " ".join(
+        str(value) for value in (
+            release.get("version"),
+            release.get("revision"),
+            board.get("kernel"),
+        ) if value
+    )
+
+
+class Capabilities:
+    """Capabilities found by a probe, or unknown (everything supported).
+
+    Requirements are strings:
+        "luci getCPUUsage"    ubus method, as "object method"
+        "file:/proc/..."      file readable through `file read`
+        "uci:passwall"        uci config present
+    """
+
+    def __init__(self, firmware: str = None, methods: dict = None, files=(), configs=None) -> None:
+        self.firmware = firmware
+        # None 表示未探测，视为全部支持（与探测前的行为一致）
+        self._methods = None if methods is None else {obj: set(names) for obj, names in methods.items()}
+        self._files = set(files)
+        self._configs = None if configs is None else set(configs)
+
+    @property
+    def known(self) -> bool:
+        """Return True if a probe filled these capabilities."""
+        return self._methods is not None
+
+    def has_method(self, obj: str, method: str) -> bool:
+        """Return True if the ubus object exposes the method."""
+        return self._methods is None or method in self._methods.get(obj, ())
+
+    def has_file(self, path: str) -> bool:
+        """Return True if the file can be read."""
+        return self._methods is None or path in self._files
+
+    def has_config(self, config: str) -> bool:
+        """Return True if the uci config exists."""
+        return self._configs is None or config in self._configs
+
+    def supports(self, requirement: str = None) -> bool:
+        """Return True if a requirement string is met; None is always met."""
+        if not requirement:
+            return True
+        if requirement.startswith("file:"):
+            return self.has_file(requirement[5:])
+        if requirement.startswith("uci:"):
+            return self.has_config(requirement[4:])
+        obj, _, method = requirement.partition(" ")
+        return self.has_method(obj, method)
+
+    def supports_call(self, obj: str, method: str, params: dict = None) -> bool:
+        """Return True if a ubus call can succeed on this router."""
+        if not self.has_method(obj, method):
+            return False
+        if obj == "file" and params and "path" in params:
+            return self.has_file(params["path"])
+        return True
+
+    def as_dict(self):
+        """Return the capabilities as json-serialisable data."""
+        return {
+            "firmware": self.firmware,
+            "methods": None if self._methods is None else {obj: sorted(names) for obj, names in self._methods.items()},
+            "files": sorted(self._files),
+            "configs": None if self._configs is None else sorted(self._configs),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Build capabilities from as_dict() output."""
+        return cls(data.get("firmware"), data.get("methods"), data.get("files") or (), data.get("configs"))
+
+
+async def async_probe(fetcher, sysauth, files, deadline=None):
+    """Probe the router, return Capabilities or None if the probe failed.
+
+    One `ubus list` for every object and its methods, then one batch with
+    `system board` (firmware), `uci configs` and a `file read` per file.
+    """
+    signatures = await fetcher.async_list_signatures("*", sysauth, deadline)
+    if not signatures:
+        return None
+
+    batch = UbusBatch()
+    board = batch.add("system", "board")
+    configs = batch.add("uci", "configs")
+    reads = {path: batch.add("file", "read", {"path": path}) for path in files}
+    results = await fetcher.async_call_batch(batch, sysauth, deadline, "probe")
+    if isinstance(results, int) or not results[board].ok:
+        _LOGGER.debug("capability probe failed: %s", results)
+        return None
+
+    # uci configs 可能不在 ACL 里，此时不按配置裁剪
+    config_names = results[configs].data.get("configs") if results[configs].ok else None
+    return Capabilities(
+        firmware_id(results[board].data),
+        {obj: list(methods or {}) for obj, methods in signatures.items()},
+        [path for path, call in reads.items() if results[call].ok],
+        config_names,
+    )
@@ -0,0 +1,136 @@
+"""
+pluggable json codec for ubus payloads
+
+Decodes straight from the response bytes with orjson when it is installed
+(Home Assistant ships it), falling back to the stdlib json module.
+
+Run this file directly for a decode micro-benchmark per payload type:
+    python custom_components/openwrt/codec.py [interfaces]
+"""
+
+import json
+import time
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is a Home Assistant core dependency
+    orjson = None
+
+
+class JsonCodec:
+    """Encode/decode json with the stdlib module."""
+
+    name = "json"
+
+    @staticmethod
+    def loads(data):
+        """Decode json from bytes or str."""
+        # json.loads(bytes) 要先探测编码，直接按 utf-8 解码反而更快
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode("utf-8")
+        return json.loads(data)
+
+    @staticmethod
+    def dumps(obj) -> bytes:
+        """Encode obj to compact utf-8 json bytes."""
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class OrjsonCodec(JsonCodec):
+    """Encode/decode json with orjson."""
+
+    name = "orjson"
+
+    @staticmethod
+    def loads(data):
+        return orjson.loads(data)
+
+    @staticmethod
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+
+CODECS = {JsonCodec.name: JsonCodec}
+if orjson is not None:
+    CODECS[OrjsonCodec.name] = OrjsonCodec
+
+
+def get_codec(name: str = None):
+    """Return the codec by name, or the fastest one available."""
+    if name is not None:
+        return CODECS[name]
+    return CODECS.get(OrjsonCodec.name, JsonCodec)
+
+
+def _sample_payloads(interfaces: int):
+    """Build ubus responses shaped like the big calls of the status poll."""
+    dump = {
+        "interface": [
+            {
+                "interface": f"vlan{i}",
+                "up": True,
+                "uptime": 86400 + i,
+                "l3_device": f"br-vlan{i}",
+                "proto": "static",
+                "device": f"eth0.{i}",
+                "ipv4-address": [{"address": f"10.{i // 256}.{i % 256}.1", "mask": 24}],
+                "ipv6-address": [],
+                "route": [{"target": "0.0.0.0", "mask": 0, "nexthop": f"10.{i // 256}.{i % 256}.254", "source": "0.0.0.0/0"}],
+                "dns-server": ["223.5.5.5", "119.29.29.29"],
+                "data": {},
+            }
+            for i in range(interfaces)
+        ]
+    }
+    devices = {
+        f"br-vlan{i}": {
+            "name": f"br-vlan{i}",
+            "up": True,
+            "devtype": "bridge",
+            "mtu": 1500,
+            "mac": "02:00:00:00:%02x:%02x" % (i // 256, i % 256),
+            "ports": [f"eth0.{i}", f"veth{i}"],
+            "stats": {key: i * 1000 for key in (
+                "rx_bytes", "tx_bytes", "rx_packets", "tx_packets", "rx_errors",
+                "tx_errors", "rx_dropped", "tx_dropped", "multicast", "collisions",
+            )},
+        }
+        for i in range(interfaces)
+    }
+    info = {
+        "localtime": 1700000000,
+        "uptime": 86400,
+        "load": [1024, 2048, 4096],
+        "memory": {"total": 1 << 30, "free": 1 << 29, "shared": 1024, "buffered": 2048, "available": 1 << 29, "cached": 4096},
+    }
+
+    def wrap(data):
+        return JsonCodec.dumps([{"jsonrpc": "2.0", "id": 1, "result": [0, data]}])
+
+    return {
+        "system info": wrap(info),
+        "network.interface dump": wrap(dump),
+        "luci-rpc getNetworkDevices": wrap(devices),
+    }
+
+
+def benchmark(interfaces: int = 64, rounds: int = 200):
+    """Return {payload type: {codec: microseconds per decode}}."""
+    results = {}
+    for kind, payload in _sample_payloads(interfaces).items():
+        timings = {"bytes": len(payload)}
+        for name, codec in CODECS.items():
+            started = time.perf_counter()
+            for _ in range(rounds):
+                codec.loads(payload)
+            timings[name] = round((time.perf_counter() - started) / rounds * 1e6, 1)
+        results[kind] = timings
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    for kind, timings in benchmark(count).items():
+        print(f"{kind:28s} {timings.pop('bytes'):8d} B  " + "  ".join(f"{k}={v}us" for k, v in timings.items()))
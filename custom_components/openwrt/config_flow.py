@@ -1,19 +1,25 @@
 """Config flow for openwrt integration."""
 from __future__ import annotations
 
+import asyncio
 import logging
-import uuid
 import voluptuous as vol
-import requests
 
-import json
 from urllib import parse
 
+from aiohttp.client_exceptions import ClientError
+from async_timeout import timeout
 from homeassistant import config_entries
 from homeassistant.core import callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
 from collections import OrderedDict
-from .const import DO_URL, DOMAIN, CONF_HOST, CONF_USERNAME, CONF_PASSWD, CONF_UPDATE_INTERVAL
+from .const import DO_URL, DOMAIN, CONF_HOST, CONF_USERNAME, CONF_PASSWD, CONF_UPDATE_INTERVAL, CONF_SSL_FINGERPRINT
+from .const import CONF_RETRY_ATTEMPTS, CONF_HEDGE_REQUESTS, DEFAULT_RETRY_ATTEMPTS
+from .const import CONF_UBUS_EVENTS, CONF_REFRESH_DEBOUNCE, DEFAULT_REFRESH_DEBOUNCE
+from .const import CONF_ADAPTIVE_INTERVAL, CONF_MIN_INTERVAL, CONF_MAX_INTERVAL, DEFAULT_MIN_INTERVAL, DEFAULT_MAX_INTERVAL
+from .const import CONF_MEDIUM_INTERVAL, CONF_SLOW_INTERVAL, DEFAULT_TIER_INTERVALS, TIER_FAST, TIER_MEDIUM, TIER_SLOW
+from .transport import parse_fingerprint
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -31,7 +37,7 @@ class FlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
         """Initialize."""
         self._errors = {}
 
-    def _login_openwrt(self, host, username, passwd):
+    async def _login_openwrt(self, host, username, passwd):
 
         header = {
             "Content-Type": "application/x-www-form-urlencoded"
@@ -39,7 +45,10 @@ class FlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
 
         body = "luci_username=" + username + "&luci_password=" + passwd
 
-        return requests.post(host + DO_URL, data=body, headers=header, verify=False, timeout=5)
+        session = async_get_clientsession(self.hass, verify_ssl=False)
+        async with timeout(5):
+            async with session.post(host + DO_URL, data=body, headers=header) as response:
+                return response.status
 
     async def async_step_user(self, user_input={}):
         self._errors = {}
@@ -55,16 +64,19 @@ class FlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
                 host, password, passwd
             )
 
-            response = await self.hass.async_add_executor_job(
-                self._login_openwrt, host, username, passwd
-            )
-            _LOGGER.debug(response)
+            try:
+                status = await self._login_openwrt(host, username, passwd)
+            except (ClientError, asyncio.TimeoutError) as error:
+                _LOGGER.debug("Login openwrt failed: %s", error)
+                self._errors["base"] = "cannot_connect"
+                return await self._show_config_form(user_input)
+            _LOGGER.debug(status)
 
-            if response.status_code == 403:
+            if status == 403:
                 self._errors["base"] = "invalid_auth"
                 return await self._show_config_form(user_input)
 
-            if response.status_code != 200:
+            if status != 200:
                 self._errors["base"] = "unkown"
                 return await self._show_config_form(user_input)
 
@@ -107,8 +119,26 @@ class OptionsFlow(config_entries.OptionsFlow):
 
     async def async_step_user(self, user_input=None):
         """Handle a flow initialized by the user."""
+        errors = {}
         if user_input is not None:
-            return self.async_create_entry(title="", data=user_input)
+            try:
+                parse_fingerprint(user_input.get(CONF_SSL_FINGERPRINT))
+            except ValueError:
+                errors[CONF_SSL_FINGERPRINT] = "invalid_fingerprint"
+
+            # 慢的分级间隔不能比快的短
+            fast = user_input.get(CONF_UPDATE_INTERVAL, DEFAULT_TIER_INTERVALS[TIER_FAST])
+            medium = user_input.get(CONF_MEDIUM_INTERVAL, DEFAULT_TIER_INTERVALS[TIER_MEDIUM])
+            slow = user_input.get(CONF_SLOW_INTERVAL, DEFAULT_TIER_INTERVALS[TIER_SLOW])
+            if medium < fast:
+                errors[CONF_MEDIUM_INTERVAL] = "invalid_tier_interval"
+            if slow < medium:
+                errors[CONF_SLOW_INTERVAL] = "invalid_tier_interval"
+            if user_input.get(CONF_MAX_INTERVAL, DEFAULT_MAX_INTERVAL) < user_input.get(CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL):
+                errors[CONF_MAX_INTERVAL] = "invalid_interval_range"
+
+            if not errors:
+                return self.async_create_entry(title="", data=user_input)
 
         return self.async_show_form(
             step_id="user",
@@ -116,8 +146,49 @@ class OptionsFlow(config_entries.OptionsFlow):
                 {
                     vol.Optional(
                         CONF_UPDATE_INTERVAL,
-                        default=self.config_entry.options.get(CONF_UPDATE_INTERVAL, 10),
-                    ): vol.All(vol.Coerce(int), vol.Range(min=10, max=3600))
+                        default=self.config_entry.options.get(CONF_UPDATE_INTERVAL, DEFAULT_TIER_INTERVALS[TIER_FAST]),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=2, max=3600)),
+                    vol.Optional(
+                        CONF_MEDIUM_INTERVAL,
+                        default=self.config_entry.options.get(CONF_MEDIUM_INTERVAL, DEFAULT_TIER_INTERVALS[TIER_MEDIUM]),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=2, max=3600)),
+                    vol.Optional(
+                        CONF_SLOW_INTERVAL,
+                        default=self.config_entry.options.get(CONF_SLOW_INTERVAL, DEFAULT_TIER_INTERVALS[TIER_SLOW]),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=2, max=86400)),
+                    vol.Optional(
+                        CONF_REFRESH_DEBOUNCE,
+                        default=self.config_entry.options.get(CONF_REFRESH_DEBOUNCE, DEFAULT_REFRESH_DEBOUNCE),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=10)),
+                    vol.Optional(
+                        CONF_UBUS_EVENTS,
+                        default=self.config_entry.options.get(CONF_UBUS_EVENTS, False),
+                    ): bool,
+                    vol.Optional(
+                        CONF_ADAPTIVE_INTERVAL,
+                        default=self.config_entry.options.get(CONF_ADAPTIVE_INTERVAL, False),
+                    ): bool,
+                    vol.Optional(
+                        CONF_MIN_INTERVAL,
+                        default=self.config_entry.options.get(CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=2, max=3600)),
+                    vol.Optional(
+                        CONF_MAX_INTERVAL,
+                        default=self.config_entry.options.get(CONF_MAX_INTERVAL, DEFAULT_MAX_INTERVAL),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=2, max=3600)),
+                    vol.Optional(
+                        CONF_SSL_FINGERPRINT,
+                        default=self.config_entry.options.get(CONF_SSL_FINGERPRINT, ""),
+                    ): str,
+                    vol.Optional(
+                        CONF_RETRY_ATTEMPTS,
+                        default=self.config_entry.options.get(CONF_RETRY_ATTEMPTS, DEFAULT_RETRY_ATTEMPTS),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=5)),
+                    vol.Optional(
+                        CONF_HEDGE_REQUESTS,
+                        default=self.config_entry.options.get(CONF_HEDGE_REQUESTS, True),
+                    ): bool,
                 }
             ),
+            errors=errors,
         )
@@ -8,27 +8,119 @@ CONF_PASSWD = "passwd"
 CONF_HOST = "host"
 CONF_TOKEN_EXPIRE_TIME = "token_expire_time"
 COORDINATOR = "coordinator"
+FETCHER = "fetcher"
+FLEET = "fleet"
 CONF_UPDATE_INTERVAL = "update_interval_seconds"
+CONF_MEDIUM_INTERVAL = "medium_interval_seconds"
+CONF_SLOW_INTERVAL = "slow_interval_seconds"
+CONF_ADAPTIVE_INTERVAL = "adaptive_interval"
+CONF_MIN_INTERVAL = "min_interval_seconds"
+CONF_MAX_INTERVAL = "max_interval_seconds"
+CONF_UBUS_EVENTS = "ubus_events"
+CONF_REFRESH_DEBOUNCE = "refresh_debounce_seconds"
+CONF_SSL_FINGERPRINT = "ssl_fingerprint"
+CONF_RETRY_ATTEMPTS = "retry_attempts"
+CONF_HEDGE_REQUESTS = "hedge_requests"
 
 UNDO_UPDATE_LISTENER = "undo_update_listener"
 
 REQUEST_TIMEOUT = 10
+# uhttpd 默认 20 秒关闭空闲连接，客户端保持时间要比它短
+KEEPALIVE_TIMEOUT = 15
+ROUTER_CONNECTION_LIMIT = 4
+# uhttpd/rpcd 在小路由器上只能同时处理很少的请求：状态批量请求和 passwall 页面各占一个，
+# 再留一个给对冲副本，否则副本排在慢的原请求后面，永远不可能先返回；
+# 加上不占名额的事件流，正好用满 ROUTER_CONNECTION_LIMIT 个连接
+ROUTER_MAX_IN_FLIGHT = 3
+# 每秒最多发出的请求数（令牌桶，允许同样大小的突发）
+ROUTER_MAX_RATE = 8
+# 请求优先级，数值越小越先发出：用户操作优先于后台轮询
+PRIORITY_USER = 0
+PRIORITY_POLL = 1
+# 只读请求失败后的重试
+DEFAULT_RETRY_ATTEMPTS = 2
+RETRY_BACKOFF = 0.2
+# ubus 结果缓存：uci 读取只在一个轮询周期内复用
+UCI_CACHE_TTL = 5
+# system board 略短于 slow 分级的默认间隔：每次 slow 轮询都重新读取，发现刷机和路由器自行重启后的变化
+BOARD_CACHE_TTL = 240
+CACHE_MAX_ENTRIES = 64
+# 启动/连接时间 = 当前时间 - uptime，轮询延迟带来的偏差在此秒数内时沿用上一次的时间
+TIMESTAMP_TOLERANCE = 30
+# 分级轮询：fast 为协调器刷新间隔（速率、CPU、连接数、开关），
+# medium 为内存、在线用户、温度、passwall 出口 IP，slow 为 uci 网络配置与接口地址
+TIER_FAST = "fast"
+TIER_MEDIUM = "medium"
+TIER_SLOW = "slow"
+DEFAULT_TIER_INTERVALS = {
+    TIER_FAST: 10,
+    TIER_MEDIUM: 30,
+    TIER_SLOW: 300,
+}
+
+# 自适应轮询时 fast 分级间隔的默认范围
+DEFAULT_MIN_INTERVAL = 5
+DEFAULT_MAX_INTERVAL = 120
+
+# 连续失败多少次后暂停轮询，改为 TCP 探测（秒）
+BREAKER_FAILURES = 3
+BREAKER_PROBE_MIN = 1
+BREAKER_PROBE_MAX = 30
+BREAKER_PROBE_TIMEOUT = 2
+
+# ubus 事件订阅；订阅成功后 slow 分级的轮询间隔放大的倍数
+EVENT_OBJECTS = ("network.interface",)
+EVENT_RESUBSCRIBE_MAX = 60
+EVENT_COVERED_FACTOR = 4
+
+# 合并实体刷新请求的等待时间（秒）
+DEFAULT_REFRESH_DEBOUNCE = 1.0
+
+# 会话管理：多久探测一次会话是否有效、会话多大时提前续期
+# （LuCI 默认会话有效期 3600 秒）、登录被拒绝后的退避范围（秒）
+SESSION_PROBE_INTERVAL = 60
+SESSION_RENEW_AGE = 50 * 60
+AUTH_BACKOFF_MIN = 30
+AUTH_BACKOFF_MAX = 60 * 60
+
+# 最近一次成功数据的持久化：存储版本、写入防抖时间（秒）
+SNAPSHOT_STORAGE_VERSION = 1
+SNAPSHOT_SAVE_DELAY = 60
+
+# 路由器能力探测结果的存储版本，刷机（固件变化）后重新探测
+CAPABILITY_STORAGE_VERSION = 1
+
+# 所有路由器合计同时进行的请求数
+FLEET_MAX_CONCURRENT = 8
+
+# 获取不到 system board 时的设备信息
+DEFAULT_VERSION_INFO = {
+    "sw_version": "1.0",
+    "device_name": "OpenWrt",
+    "model": "OpenWrt Router",
+}
+
 # OPENWRT URL
 DO_URL = "/cgi-bin/luci/"
 UBUS_URL = "/ubus/"
 
 # Sensor Configuration
+# requires: 路由器缺少该能力时不创建传感器，格式见 capabilities.Capabilities
+# 数值传感器以原始单位（B、B/s）上报，suggested_unit_of_measurement 为默认显示单位，由 HA 换算
 SENSOR_TYPES = {
     "openwrt_uptime": {
         "icon": "mdi:clock-time-eight",
-        "label": "OpenWrt启动时长",
-        "name": "uptime",
+        "label": "OpenWrt启动时间",
+        "name": "boot_time",
+        "device_class": "timestamp",
     },
     "openwrt_cpu": {
         "icon": "mdi:cpu-64-bit",
         "label": "CPU占用",
         "name": "CPU",
         "unit_of_measurement": "%",
+        "requires": "luci getCPUUsage",
+        "state_class": "measurement",
     },
     "openwrt_cputemp": {
         "icon": "mdi:thermometer",
@@ -36,84 +128,68 @@ SENSOR_TYPES = {
         "name": "CPU_temperature",
         "unit_of_measurement": "°C",
         "device_class": "temperature",
+        "requires": "luci getCPUInfo",
     },
     "openwrt_memory": {
         "icon": "mdi:memory",
         "label": "内存占用",
         "name": "Memory",
         "unit_of_measurement": "%",
+        "state_class": "measurement",
     },
     "openwrt_memory_total": {
         "icon": "mdi:memory",
         "label": "内存总数",
         "name": "Memory_Total",
         "unit_of_measurement": "B",
-    },
-    "openwrt_memory_total_gb": {
-        "icon": "mdi:memory",
-        "label": "内存总数",
-        "name": "Memory_Total_GB",
-        "unit_of_measurement": "GiB",
+        "device_class": "data_size",
+        "state_class": "measurement",
+        "suggested_unit_of_measurement": "MiB",
     },
     "openwrt_memory_free": {
         "icon": "mdi:memory",
         "label": "空闲内存",
         "name": "Memory_Free",
         "unit_of_measurement": "B",
-    },
-    "openwrt_memory_free_gb": {
-        "icon": "mdi:memory",
-        "label": "空闲内存",
-        "name": "Memory_Free_GB",
-        "unit_of_measurement": "GiB",
+        "device_class": "data_size",
+        "state_class": "measurement",
+        "suggested_unit_of_measurement": "MiB",
     },
     "openwrt_memory_shared": {
         "icon": "mdi:memory",
         "label": "共享内存",
         "name": "Memory_Share",
         "unit_of_measurement": "B",
-    },
-    "openwrt_memory_shared_gb": {
-        "icon": "mdi:memory",
-        "label": "共享内存",
-        "name": "Memory_Share_GB",
-        "unit_of_measurement": "GiB",
+        "device_class": "data_size",
+        "state_class": "measurement",
+        "suggested_unit_of_measurement": "MiB",
     },
     "openwrt_memory_buffered": {
         "icon": "mdi:memory",
         "label": "缓冲内存",
         "name": "Memory_Buffered",
         "unit_of_measurement": "B",
-    },
-    "openwrt_memory_buffered_gb": {
-        "icon": "mdi:memory",
-        "label": "缓冲内存",
-        "name": "Memory_Buffered_GB",
-        "unit_of_measurement": "GiB",
+        "device_class": "data_size",
+        "state_class": "measurement",
+        "suggested_unit_of_measurement": "MiB",
     },
     "openwrt_memory_available": {
         "icon": "mdi:memory",
         "label": "可用内存",
         "name": "Memory_Available",
         "unit_of_measurement": "B",
-    },
-    "openwrt_memory_available_gb": {
-        "icon": "mdi:memory",
-        "label": "可用内存",
-        "name": "Memory_Available_GB",
-        "unit_of_measurement": "GiB",
+        "device_class": "data_size",
+        "state_class": "measurement",
+        "suggested_unit_of_measurement": "MiB",
     },
     "openwrt_memory_cached": {
         "icon": "mdi:memory",
         "label": "缓存内存",
         "name": "Memory_Cached",
         "unit_of_measurement": "B",
-    },
-    "openwrt_memory_cached_gb": {
-        "icon": "mdi:memory",
-        "label": "缓存内存",
-        "name": "Memory_Cached_GB",
-        "unit_of_measurement": "GiB",
+        "device_class": "data_size",
+        "state_class": "measurement",
+        "suggested_unit_of_measurement": "MiB",
     },
     "openwrt_wan_ip": {
         "icon": "mdi:wan",
@@ -122,8 +198,9 @@ SENSOR_TYPES = {
     },
     "openwrt_wan_uptime": {
         "icon": "mdi:timer-sync-outline",
-        "label": "WAN Uptime",
-        "name": "Wan_uptime",
+        "label": "WAN 连接时间",
+        "name": "Wan_connected",
+        "device_class": "timestamp",
     },
     "openwrt_wan6_ip": {
         "icon": "mdi:wan",
@@ -132,58 +209,96 @@ SENSOR_TYPES = {
     },
     "openwrt_wan6_uptime": {
         "icon": "mdi:timer-sync-outline",
-        "label": "WAN IP6 Uptime",
-        "name": "Wan6_uptime",
+        "label": "WAN IP6 连接时间",
+        "name": "Wan6_connected",
+        "device_class": "timestamp",
     },
     "openwrt_user_online": {
         "icon": "mdi:account-multiple",
         "label": "在线用户数",
         "name": "user_online",
+        "requires": "luci getOnlineUsers",
+        "state_class": "measurement",
     },
     "openwrt_conncount": {
         "icon": "mdi:lan-connect",
         "label": "活动连接",
         "name": "conncount",
+        "requires": "file:/proc/sys/net/netfilter/nf_conntrack_count",
+        "state_class": "measurement",
     },
     "openwrt_tx": {
         "icon": "mdi:upload-network",
         "label": "上传总量",
         "name": "tx",
-        "unit_of_measurement": "GB",
+        "unit_of_measurement": "B",
+        "device_class": "data_size",
+        "state_class": "total_increasing",
+        "suggested_unit_of_measurement": "GiB",
+        "requires": "luci-rpc getNetworkDevices",
     },
     "openwrt_tx_packets": {
         "icon": "mdi:upload-network",
         "label": "上传速度",
         "name": "tx_packets",
-        "unit_of_measurement": "KB/s",
+        "unit_of_measurement": "B/s",
+        "device_class": "data_rate",
+        "state_class": "measurement",
+        "suggested_unit_of_measurement": "KiB/s",
+        "requires": "luci getRealtimeStats",
     },
     "openwrt_rx": {
         "icon": "mdi:download-network",
         "label": "下载总量",
         "name": "rx",
-        "unit_of_measurement": "GB",
+        "unit_of_measurement": "B",
+        "device_class": "data_size",
+        "state_class": "total_increasing",
+        "suggested_unit_of_measurement": "GiB",
+        "requires": "luci-rpc getNetworkDevices",
     },
     "openwrt_rx_packets": {
         "icon": "mdi:download-network",
         "label": "下载速度",
         "name": "rx_packets",
-        "unit_of_measurement": "KB/s",
+        "unit_of_measurement": "B/s",
+        "device_class": "data_rate",
+        "state_class": "measurement",
+        "suggested_unit_of_measurement": "KiB/s",
+        "requires": "luci getRealtimeStats",
     },
     "openwrt_passwall_ip": {
         "icon": "mdi:ip-network-outline",
         "label": "PassWall IP",
         "name": "passwall_ip",
+        "requires": "uci:passwall",
     },
     "openwrt_passwall_country": {
         "icon": "mdi:lan-connect",
         "label": "PassWall节点",
         "name": "passwall_country",
+        "requires": "uci:passwall",
     },
     "openwrt_isold": {
         "icon": "mdi:clock-time-twelve-outline",
         "label": "是否旧数据",
         "name": "isold",
     },
+    "openwrt_poll_interval": {
+        "icon": "mdi:timer-sync-outline",
+        "label": "轮询间隔",
+        "name": "poll_interval",
+        "unit_of_measurement": "s",
+        "entity_category": "diagnostic",
+    },
+    # 最近一次成功轮询的时间：数据过期（openwrt_isold）时显示旧数据有多旧
+    "querytime": {
+        "icon": "mdi:clock-check-outline",
+        "label": "最近成功轮询",
+        "name": "last_good_poll",
+        "device_class": "timestamp",
+        "entity_category": "diagnostic",
+    },
 }
 
 BUTTON_TYPES = {
@@ -255,5 +370,9 @@ SWITCH_TYPES = {
         "name": "passwall",
         "turn_on_body": "1",
         "turn_off_body": "0",
+        # 开关状态对应的 uci 选项，随状态轮询一起批量读取
+        "config": "passwall",
+        "section": "@global[0]",
+        "option": "enabled",
     },
 }
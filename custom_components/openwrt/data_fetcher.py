@@ -3,17 +3,12 @@ get openwrt info by token and sysauth
 """
 
 import logging
-import requests
 import re
 import asyncio
-import json
 import time
-import datetime
-from urllib import parse
 
 from async_timeout import timeout
-from aiohttp.client_exceptions import ClientConnectorError
-from homeassistant.helpers.aiohttp_client import async_create_clientsession
+from aiohttp.client_exceptions import ClientError
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.update_coordinator import UpdateFailed
 
@@ -21,118 +16,259 @@ from .const import (
     DO_URL,
     UBUS_URL,
     SWITCH_TYPES,
-    REQUEST_TIMEOUT,
+    PRIORITY_USER,
+    DEFAULT_TIER_INTERVALS,
+    TIER_FAST,
+    TIER_MEDIUM,
+    TIER_SLOW,
+    EVENT_COVERED_FACTOR,
 )
+from .transport import Deadline, RouterTransport
+from .limiter import RouterLimiter
+from .retry import RetryPolicy, is_idempotent
+from .cache import UbusCache
+from .breaker import CircuitBreaker
+from .capabilities import Capabilities, firmware_id
+from .session import LoginRejected, SessionManager
+from .codec import get_codec
+from .extractors import extract, extracted_calls
+from .snapshot import EMPTY_SNAPSHOT, Snapshot
+from .ubus import UBUS_STATUS_NO_DATA, UBUS_STATUS_PERMISSION_DENIED, UbusBatch, UbusResult
 
 _LOGGER = logging.getLogger(__name__)
 
+# 状态调用：名称 -> (分级, ubus object, method, params)，结果由 extractors.py 中的提取器解析
+STATUS_CALLS = {
+    "cpu_usage": (TIER_FAST, "luci", "getCPUUsage", None),
+    "conncount": (TIER_FAST, "file", "read", {"path": "/proc/sys/net/netfilter/nf_conntrack_count"}),
+    "network_devices": (TIER_FAST, "luci-rpc", "getNetworkDevices", None),
+    "realtime_stats": (TIER_FAST, "luci", "getRealtimeStats", {"mode": "interface", "device": "br-lan"}),
+    "system_info": (TIER_MEDIUM, "system", "info", None),
+    "cpu_info": (TIER_MEDIUM, "luci", "getCPUInfo", None),
+    "temp_info": (TIER_MEDIUM, "luci", "getTempInfo", None),
+    "online_users": (TIER_MEDIUM, "luci", "getOnlineUsers", None),
+    "network_config": (TIER_SLOW, "uci", "get", {"config": "network"}),
+    "interface_dump": (TIER_SLOW, "network.interface", "dump", None),
+    # 设备信息：随 slow 分级读取，用来发现刷机（固件变化后重新探测能力）
+    "board": (TIER_SLOW, "system", "board", None),
+}
+
+# 本次轮询没有请求的调用
+NOT_POLLED = UbusResult(UBUS_STATUS_NO_DATA, error="not due")
+
 
 class DataFetcher:
     """fetch the openwrt data"""
 
-    def __init__(self, hass: HomeAssistant, host: str, username: str, passwd: str) -> None:
+    def __init__(self, hass: HomeAssistant, host: str, username: str, passwd: str, ssl_fingerprint: str = None, retry_policy: RetryPolicy = None, tier_intervals: dict = None, fleet=None) -> None:
         self._host = host
         self._username = username
         self._passwd = passwd
         self._hass = hass
-        self._session_client = async_create_clientsession(hass)
-        self._data = {}
-        self._last_successful_data = {}
+        self._transport = RouterTransport(host, ssl_fingerprint)
+        self._limiter = RouterLimiter()
+        self._fleet = fleet
+        self._retry = retry_policy or RetryPolicy()
+        self._cache = UbusCache()
+        self.breaker = CircuitBreaker(hass, host)
+        self._tier_intervals = dict(DEFAULT_TIER_INTERVALS, **(tier_intervals or {}))
+        self._tier_next_due = {tier: 0 for tier in self._tier_intervals}
+        self._event_covered = set()
+        self._capabilities = Capabilities()
+        self._firmware = None
+        self._pruned_calls = []
+        self._codec = get_codec()
+        self._decode_stats = {}
+        self._passwall_data = {}
+        # 最近一次成功轮询的快照，不可变，直接交给协调器和实体共享
+        self._last_good = EMPTY_SNAPSHOT
+        self._poll_stats = {
+            "polls": 0,
+            "last_poll_duration": None,
+            "last_poll_round_trips": None,
+            "last_poll_calls": None,
+            "last_poll_tiers": None,
+            "last_poll_sections_reused": None,
+            "extractors_failed": 0,
+            "keys_unavailable": 0,
+        }
         self._token_ = ""
         self._session_ = ""
-        self._default_data = {
-            "openwrt_conncount": "0",
-            "openwrt_cpu": "0",
-            "openwrt_cputemp": 0,
-            "openwrt_isold": False,
-            "openwrt_memory": 20.0,
-            "openwrt_memory_attrs": {
-                "available": 0,
-                "buffered": 0,
-                "cached": 0,
-                "free": 0,
-                "shared": 0,
-                "total": 0
-            },
-            "openwrt_memory_available": 0,
-            "openwrt_memory_available_gb": 0,
-            "openwrt_memory_buffered": 0,
-            "openwrt_memory_buffered_gb": 0,
-            "openwrt_memory_cached": 0,
-            "openwrt_memory_cached_gb": 0,
-            "openwrt_memory_free": 0,
-            "openwrt_memory_free_gb": 0,
-            "openwrt_memory_shared": 0,
-            "openwrt_memory_shared_gb": 0,
-            "openwrt_memory_total": 0,
-            "openwrt_memory_total_gb": 0,
-            "openwrt_passwall_country": "默认",
-            "openwrt_passwall_ip": "0.0.0.0",
-            "openwrt_rx": "0",
-            "openwrt_rx_packets": "0",
-            "openwrt_tx": "0",
-            "openwrt_tx_packets": "0",
-            "openwrt_uptime": "0分钟",
-            "openwrt_user_online": 0,
-            "openwrt_wan6_ip": "",
-            "openwrt_wan6_uptime": "",
-            "openwrt_wan_ip": "192.168.88.2",
-            "openwrt_wan_uptime": "0分钟",
-            "switch": [
-                {
-                    "name": "passwall",
-                    "onoff": "on"
-                }
-            ]
+        self._token_task_ = ""
+        self._sessions = SessionManager(hass, self._async_login, self._async_probe_session)
+
+    def restore(self, snapshot: Snapshot):
+        """Seed the last successful data from a persisted snapshot."""
+        self._last_good = snapshot
+
+    @property
+    def host(self):
+        """Return the router address."""
+        return self._host
+
+    @property
+    def capabilities(self):
+        """Return what the router supports, everything until probed."""
+        return self._capabilities
+
+    def set_capabilities(self, capabilities: Capabilities):
+        """Leave calls the router does not support out of every poll."""
+        self._capabilities = capabilities
+        # system board 用来发现刷机，始终保留
+        self._pruned_calls = sorted(
+            name for name, (tier, obj, method, params) in STATUS_CALLS.items()
+            if name != "board" and not capabilities.supports_call(obj, method, params)
+        )
+
+    @property
+    def firmware(self):
+        """Return the firmware id seen in the last `system board`, or None."""
+        return self._firmware
+
+    @property
+    def probe_files(self):
+        """Return the files the status poll reads, checked by the capability probe."""
+        return sorted(
+            params["path"] for tier, obj, method, params in STATUS_CALLS.values()
+            if obj == "file" and method == "read"
+        )
+
+    @property
+    def capability_stats(self):
+        """Return the probed capabilities and the pruned calls, for diagnostics."""
+        return {
+            "known": self._capabilities.known,
+            "firmware": self._capabilities.firmware,
+            "current_firmware": self._firmware,
+            "pruned_calls": self._pruned_calls,
+            "switches": self.supported_switches,
         }
 
-    def requestget_data(self, url, headerstr):
-        responsedata = requests.get(url, headers=headerstr)
-        if responsedata.status_code != 200:
-            return responsedata.status_code
-        json_text = responsedata.content.decode('utf-8')
-        resdata = json.loads(json_text)
+    @property
+    def connection_stats(self):
+        """Return keep-alive connection reuse counters."""
+        return self._transport.connection_stats
+
+    @property
+    def fleet(self):
+        """Return the fleet scheduler this router belongs to, or None."""
+        return self._fleet
+
+    @property
+    def limiter_stats(self):
+        """Return per-lane queueing counters of the router limiter."""
+        return self._limiter.stats
+
+    @property
+    def cache_stats(self):
+        """Return ubus result cache counters."""
+        return self._cache.stats
+
+    @property
+    def retry_stats(self):
+        """Return retry and hedging counters."""
+        return self._retry.stats
+
+    async def async_request(self, method, url, headers=None, deadline: Deadline = None, **kwargs):
+        """Send a request on the keep-alive pool, return (status, body bytes).
+
+        Every request toward the router waits for a limiter slot first, in
+        the lane of its deadline's priority, then for a fleet-wide slot;
+        both waits count against the deadline.
+        """
+        if deadline is None:
+            deadline = Deadline()
+        async with timeout(deadline.remaining()):
+            await self._limiter.acquire(deadline.priority)
+        try:
+            if self._fleet is None:
+                return await self._transport.async_request(method, url, headers, deadline=deadline, **kwargs)
+            async with timeout(deadline.remaining()):
+                async with self._fleet.request_slot():
+                    return await self._transport.async_request(method, url, headers, deadline=deadline, **kwargs)
+        finally:
+            self._limiter.release()
+
+    def async_stream(self, url, headers=None):
+        """Open a long-lived GET on the pool.
+
+        Event streams bypass the limiter: they keep a connection open but no
+        rpcd worker busy, and would otherwise hold a slot forever.
+        """
+        return self._transport.stream(url, headers)
+
+    async def async_list_objects(self, pattern, sysauth, deadline=None):
+        """Return the ubus object names matching a pattern, [] on failure."""
+        return sorted(await self.async_list_signatures(pattern, sysauth, deadline))
+
+    async def async_list_signatures(self, pattern, sysauth, deadline=None):
+        """Return {object: {method: signature}} matching a pattern, {} on failure."""
+        if deadline is None:
+            deadline = Deadline()
+        body = self._codec.dumps({"jsonrpc": "2.0", "id": 1, "method": "list", "params": [pattern]})
+        header = {
+            "Content-Type": "application/json"
+        }
+        try:
+            async with deadline.timeout():
+                status, content = await self.async_request("POST", self._host + UBUS_URL, header, deadline=deadline, data=body)
+        except (ClientError, asyncio.TimeoutError) as error:
+            _LOGGER.debug("ubus list %s failed: %s", pattern, error)
+            return {}
+        if status != 200:
+            return {}
+        result = self.decode_json(content, "list").get("result")
+        return result if isinstance(result, dict) else {}
+
+    async def async_close(self):
+        """Close the connections toward the router."""
+        self.breaker.stop()
+        self._sessions.stop()
+        await self._transport.async_close()
+
+    async def requestget_data(self, url, headerstr, deadline=None):
+        status, body = await self.async_request("GET", url, headerstr, deadline=deadline)
+        if status != 200:
+            return status
+        resdata = self.decode_json(body, "luci_get")
         return resdata
 
-    def requestpost_data(self, url, headerstr, datastr):
-        responsedata = requests.post(url, headers=headerstr, data=datastr, verify=False)
-        if responsedata.status_code != 200:
-            return responsedata.status_code
-        json_text = responsedata.content.decode('utf-8')
-        resdata = json.loads(json_text)
+    async def requestpost_data(self, url, headerstr, datastr, deadline=None):
+        status, body = await self.async_request("POST", url, headerstr, deadline=deadline, data=datastr)
+        if status != 200:
+            return status
+        resdata = self.decode_json(body, "luci_post")
         return resdata
 
-    def requestget_data_text(self, url, headerstr, datastr):
-        responsedata = requests.post(url, headers=headerstr, verify=False)
-        if responsedata.status_code != 200:
-            return responsedata.status_code
-        resdata = responsedata.content.decode('utf-8')
+    async def requestget_data_text(self, url, headerstr, datastr, deadline=None):
+        status, body = await self.async_request("POST", url, headerstr, deadline=deadline)
+        if status != 200:
+            return status
+        resdata = body.decode('utf-8')
         return resdata
 
-    def requestpost_json(self, url, headerstr, json_body):
-        responsedata = requests.post(url, headers=headerstr, json=json_body, verify=False)
-        if responsedata.status_code != 200:
-            return responsedata.status_code
-        json_text = responsedata.content.decode('utf-8')
-        resdata = json.loads(json_text)
+    async def requestpost_json(self, url, headerstr, json_body, deadline=None):
+        status, body = await self.async_request("POST", url, headerstr, deadline=deadline, json=json_body)
+        if status != 200:
+            return status
+        resdata = self.decode_json(body, "ubus_json")
         return resdata
 
-    def requestpost_json2(self, url, headerstr, json_body):
-        responsedata = requests.post(url, headers=headerstr, data=json_body, verify=False)
-        if responsedata.status_code != 200:
-            return responsedata.status_code
-        json_text = responsedata.content.decode('utf-8')
-        resdata = json.loads(json_text)
+    async def requestpost_json2(self, url, headerstr, json_body, deadline=None):
+        status, body = await self.async_request("POST", url, headerstr, deadline=deadline, data=json_body)
+        if status != 200:
+            return status
+        resdata = self.decode_json(body, "ubus_json")
         return resdata
 
-    def requestpost_cookies(self, url, headerstr, body):
-        responsedata = requests.get(url, headers=headerstr, data=body, verify=False)
-        if responsedata.status_code == 403:
+    async def requestpost_cookies(self, url, headerstr, body, deadline=None):
+        status, content = await self.async_request("GET", url, headerstr, deadline=deadline, data=body)
+        if status == 403:
             return 403
-        if responsedata.status_code != 200 and responsedata.status_code != 302:
-            return responsedata.status_code
+        if status != 200 and status != 302:
+            return status
 
-        result = responsedata.text
+        result = content.decode('utf-8', errors='replace')
         res = re.compile(r'"sessionid": "(.*?)", "token": "(.*?)"')
         b = re.search(res, result)
         
@@ -145,56 +281,92 @@ class DataFetcher:
             _LOGGER.info("session: %s", self._session_)
         return [self._session_, self._token_, self._session_]
 
-    def seconds_to_dhms(self, seconds):
-        if isinstance(seconds, str):
-            return seconds.replace("\n%", "")
-        days = seconds // (3600 * 24)
-        hours = (seconds // 3600) % 24
-        minutes = (seconds // 60) % 60
-        seconds = seconds % 60
-        if days > 0:
-            return ("{0}天{1}小时{2}分钟".format(days, hours, minutes))
-        if hours > 0:
-            return ("{0}小时{1}分钟".format(hours, minutes))
-        if minutes > 0:
-            return ("{0}分钟{1}秒".format(minutes, seconds))
-        return ("{0}秒".format(seconds))
-
-    def hum_convert(self, value):
-        units = ["B", "KB", "MB", "GB", "TB", "PB"]
-        size = 1024.0
-        for i in range(len(units)):
-            if (value / size) < 1:
-                return "%.2f%s" % (value, units[i])
-            value = value / size
-
-    def hum_convert_nounit(self, value):
-        units = ["B", "KB", "MB", "GB", "TB", "PB"]
-        size = 1024.0
-        for i in range(len(units)):
-            if (value / size) < 1:
-                return "%.2f" % (value)
-            value = value / size
-
-    def speed_convert(self,  value):
-        value = value/8
-        units = ["B/s", "KB/s", "MB/s", "GB/s", "TB/s", "PB/s"]
-        size = 1024.0
-        for i in range(len(units)):
-            if (value / size) < 1:
-                return "%.2f%s" % (value, units[i])
-            value = value / size
-
-    def speed_convert_nounit(self,  value):
-        units = ["B/s", "KB/s", "MB/s", "GB/s", "TB/s", "PB/s"]
-        size = 1024.0
-        for i in range(len(units)):
-            if (value / size) < 1:
-                return "%.2f" % (value)
-            value = value / size
-
-    async def login_openwrt(self):
-        hass = self._hass
+    def decode_json(self, body, kind):
+        """Decode a json response body, recording decode time per payload kind."""
+        started = time.perf_counter()
+        resdata = self._codec.loads(body)
+        elapsed = (time.perf_counter() - started) * 1000
+
+        stats = self._decode_stats.setdefault(kind, {"count": 0, "bytes": 0, "total_ms": 0.0, "last_ms": 0.0})
+        stats["count"] += 1
+        stats["bytes"] += len(body)
+        stats["total_ms"] += elapsed
+        stats["last_ms"] = elapsed
+        return resdata
+
+    @property
+    def decode_stats(self):
+        """Return decode time per payload kind, for diagnostics."""
+        return {
+            "codec": self._codec.name,
+            "payloads": {
+                kind: {
+                    "count": stats["count"],
+                    "avg_bytes": round(stats["bytes"] / stats["count"]),
+                    "avg_ms": round(stats["total_ms"] / stats["count"], 3),
+                    "last_ms": round(stats["last_ms"], 3),
+                }
+                for kind, stats in self._decode_stats.items()
+            },
+        }
+
+    async def async_call_batch(self, batch: UbusBatch, sysauth, deadline=None, kind="ubus"):
+        """Send every call of the batch in one POST to UBUS_URL.
+
+        Calls answered by the cache are left out of the POST, a batch fully
+        answered by the cache never reaches the router. Read-only batches go
+        through the retry/hedging policy; anything with a write (uci set,
+        reboot...) is sent exactly once and invalidates the cache.
+        Return {call: UbusResult}, or the http status code on failure; a
+        batch whose every sent call was denied returns 403 (expired session).
+        """
+        if deadline is None:
+            deadline = Deadline()
+
+        results = {}
+        calls = []
+        for call in batch:
+            cached = self._cache.get(call)
+            if cached is not None:
+                results[call] = cached
+            else:
+                calls.append(call)
+        if not calls:
+            return results
+
+        body = batch.payload(sysauth, self._codec, calls)
+        header = {
+            "Content-Type": "application/json"
+        }
+        url = self._host + UBUS_URL
+
+        async def post():
+            status, content = await self.async_request("POST", url, header, deadline=deadline, data=body)
+            if status != 200:
+                return status
+            return batch.parse(self.decode_json(content, kind), calls)
+
+        if is_idempotent(calls):
+            fetched = await self._retry.run(post, deadline, kind)
+        else:
+            fetched = await post()
+        if isinstance(fetched, int):
+            return fetched
+        # rpcd 会话过期时 uhttpd 仍返回 200，发出的每个调用都是 access denied，按 403 交给调用方重新登录
+        if all(result.status == UBUS_STATUS_PERMISSION_DENIED for result in fetched.values()):
+            _LOGGER.debug("async_call_batch: every call denied, session expired")
+            return 403
+
+        for call, result in fetched.items():
+            if result.ok:
+                self._cache.invalidate(call)
+                self._cache.put(call, result)
+        results.update(fetched)
+        return results
+
+    async def login_openwrt(self, deadline=None):
+        if deadline is None:
+            deadline = Deadline()
         host = self._host
         username = self._username
         passwd = self._passwd
@@ -207,8 +379,8 @@ class DataFetcher:
         # _LOGGER.debug("Requests remaining: %s", url)
         
         try:
-            async with timeout(REQUEST_TIMEOUT):
-                resdata = await self._hass.async_add_executor_job(self.requestpost_cookies, url, header, body)
+            async with deadline.timeout():
+                resdata = await self.requestpost_cookies(url, header, body, deadline=deadline)
                 _LOGGER.debug("login_openwrt resdata: %s", resdata)
                 
                 if isinstance(resdata, int) and resdata == 403:
@@ -222,54 +394,84 @@ class DataFetcher:
                     _LOGGER.debug("login_successfully for OPENWRT")
                     
         except asyncio.TimeoutError:
-            _LOGGER.error("Timeout fetching login_openwrt data (timeout=%ds)", REQUEST_TIMEOUT)
+            _LOGGER.error("Timeout fetching login_openwrt data (timeout=%ds)", deadline.budget)
             resdata = [403, "", ""]
             
-        except (ClientConnectorError) as error:
+        except ClientError as error:
+            # 连接失败（如路由器离线）是暂时的，由调用方按登录失败处理并计入熔断
             _LOGGER.error("Error fetching login_openwrt data: %s", error)
-            raise UpdateFailed(error)
+            return None
         
         return resdata
 
-    async def _check_openwrt_passwall(self, sysauth):
-        header = {
-            "Content-Type": "application/json",
-            "Cookie": "sysauth_http=" + sysauth
-        }
-        postJson = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "call",
-            "params": ["" + self._session_ + "", "uci", "get", {"config": "passwall", "section": "@global[0]", "option": "enabled"}]
-        }
+    @property
+    def allow_login(self):
+        """Return False while backing off after the router rejected our credentials."""
+        return not self._sessions.blocked
 
-        url = self._host + UBUS_URL
+    @property
+    def session_stats(self):
+        """Return session manager counters."""
+        return self._sessions.stats
+
+    @property
+    def token(self):
+        """Return the LuCI csrf token of the current session."""
+        return self._token_
+
+    def invalidate_token(self):
+        """Drop the session after a 401; a new one is fetched in the background."""
+        self._sessions.invalidate()
+
+    async def get_access_token(self, deadline=None):
+        """Return the sysauth session shared by every entity of this router.
+
+        Only waits for a login when there is no valid session at all;
+        renewal otherwise happens in the background.
+        """
+        return await self._sessions.async_get(deadline)
+
+    async def _async_login(self, deadline):
+        """Log in for the session manager, return the new session id."""
+        resdata = await self.login_openwrt(deadline)
+
+        if not isinstance(resdata, list):
+            # 其他 http 状态码（如 500）：路由器暂时无法登录，下次再试
+            return None
+
+        if not resdata or resdata[0] == 9999:
+            # 用户名密码错误
+            raise LoginRejected
+
+        if resdata[0] == 403:
+            return None
 
+        return self._session_
+
+    async def _async_probe_session(self, sid, deadline):
+        """Return whether the router still knows the session, None if unknown."""
+        batch = UbusBatch()
+        access = batch.add("session", "access", {"scope": "ubus", "object": "system", "function": "info"})
         try:
-            async with timeout(REQUEST_TIMEOUT):
-                resdata = await self._hass.async_add_executor_job(self.requestpost_json, url, header, postJson)
-                _LOGGER.debug("_check_openwrt_passwall resdata: %s", resdata)
-                
-        except asyncio.TimeoutError:
-            _LOGGER.error("Timeout fetching _check_openwrt_passwall data (timeout=%ds)", REQUEST_TIMEOUT)
-            # return "unavailable"
-            return False
-        
-        except (ClientConnectorError) as error:
-            _LOGGER.error("Error fetching _check_openwrt_passwall data: %s", error)
-            raise UpdateFailed(error)
-            # return "unavailable"
+            async with deadline.timeout():
+                results = await self.async_call_batch(batch, sid, deadline, "session")
+        except (ClientError, asyncio.TimeoutError):
+            return None
+        if results in (401, 403):
             return False
-
-        if resdata["result"][1]["value"] == "1":
-            return True
-        else:
+        if isinstance(results, int):
+            return None
+        result = results[access]
+        if result.status == UBUS_STATUS_PERMISSION_DENIED:
             return False
+        return bool(result.ok and result.data.get("access"))
 
-    async def _get_openwrt_passwall(self, sysauth):
-        # 保存当前值，以便在超时时恢复
-        current_passwall_ip = self._data.get("openwrt_passwall_ip", "0.0.0.0")
-        current_passwall_country = self._data.get("openwrt_passwall_country", "未知")
+    async def _get_openwrt_passwall(self, sysauth, deadline=None):
+        if deadline is None:
+            deadline = Deadline()
+        # 保存当前值，以便在超时时恢复；结果单独保存，由 get_data 合并
+        current_passwall_ip = self._last_good.get("openwrt_passwall_ip", "0.0.0.0")
+        current_passwall_country = self._last_good.get("openwrt_passwall_country", "未知")
 
         header = {
             "Cookie": "sysauth_http=" + sysauth
@@ -282,317 +484,435 @@ class DataFetcher:
         # _LOGGER.debug("_get_openwrt_passwall Url: %s", url)
 
         try:
-            async with timeout(REQUEST_TIMEOUT):
-                resdata = await self._hass.async_add_executor_job(self.requestget_data, url, header)
+            async with deadline.timeout():
+                resdata = await self.requestget_data(url, header, deadline=deadline)
                 _LOGGER.debug("_get_openwrt_passwall resdata: %s", resdata)
                 
         except asyncio.TimeoutError:
-            _LOGGER.error("Timeout fetching _get_openwrt_passwall data (timeout=%ds)", REQUEST_TIMEOUT)
+            _LOGGER.error("Timeout fetching _get_openwrt_passwall data (timeout=%ds)", deadline.budget)
             # 超时时保持之前的数据不变
-            self._data["openwrt_passwall_ip"] = current_passwall_ip
-            self._data["openwrt_passwall_country"] = current_passwall_country
-            
-            querytime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self._data["querytime"] = querytime
+            self._passwall_data["openwrt_passwall_ip"] = current_passwall_ip
+            self._passwall_data["openwrt_passwall_country"] = current_passwall_country
             return
         
-        except (ClientConnectorError) as error:
+        except ClientError as error:
             _LOGGER.error("Error fetching _get_openwrt_passwall data: %s", error)
             # 错误时保持之前的数据不变
-            self._data["openwrt_passwall_ip"] = current_passwall_ip
-            self._data["openwrt_passwall_country"] = current_passwall_country
-            
-            querytime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self._data["querytime"] = querytime
+            self._passwall_data["openwrt_passwall_ip"] = current_passwall_ip
+            self._passwall_data["openwrt_passwall_country"] = current_passwall_country
             return
 
         if resdata == 401 or resdata == 403:
-            self._data["openwrt_passwall_ip"] = "0.0.0.0"
-            self._data["openwrt_passwall_country"] = "未授权"
-            
-            querytime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self._data["querytime"] = querytime
+            self._passwall_data["openwrt_passwall_ip"] = "0.0.0.0"
+            self._passwall_data["openwrt_passwall_country"] = "未授权"
             return
 
         if resdata == 502:
-            self._data["openwrt_passwall_ip"] = "0.0.0.0"
-            self._data["openwrt_passwall_country"] = "服务不可用"
-            
-            querytime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self._data["querytime"] = querytime
+            self._passwall_data["openwrt_passwall_ip"] = "0.0.0.0"
+            self._passwall_data["openwrt_passwall_country"] = "服务不可用"
             return
 
         if isinstance(resdata, dict):
-            self._data["openwrt_passwall_ip"] = resdata.get("outboard")
-            self._data["openwrt_passwall_country"] = resdata.get("outboardip").get("country")
-
-            querytime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self._data["querytime"] = querytime
+            self._passwall_data["openwrt_passwall_ip"] = resdata.get("outboard")
+            self._passwall_data["openwrt_passwall_country"] = resdata.get("outboardip").get("country")
 
         return
 
-    async def _get_openwrt_status(self, sysauth):
-        # 保存当前值，以便在超时时恢复
-        current_data = self._data.copy()
-
-        postData = '[{"jsonrpc": "2.0", "id": 1, "method": "call", "params": ["' + sysauth + '", "system", "info", {}]},' + \
-            '{"jsonrpc": "2.0", "id": 2, "method": "call", "params": ["' + sysauth + '", "luci", "getCPUInfo", {}]},' + \
-            '{"jsonrpc": "2.0", "id": 3, "method": "call", "params": ["' + sysauth + '", "luci", "getCPUUsage", {}]},' +\
-            '{"jsonrpc": "2.0", "id": 4, "method": "call", "params": ["' + sysauth + '", "luci", "getTempInfo", {}]},' +\
-            '{"jsonrpc": "2.0", "id": 5, "method": "call", "params": ["' + sysauth + '", "file", "read", {"path": "/proc/sys/net/netfilter/nf_conntrack_count"}]},' +\
-            '{"jsonrpc": "2.0", "id": 6, "method": "call", "params": ["' + sysauth + '", "luci", "getOnlineUsers", {}]},' +\
-            '{"jsonrpc": "2.0", "id": 7, "method": "call", "params": ["' + sysauth + '", "uci", "get", {"config": "network"}]},' +\
-            '{"jsonrpc": "2.0", "id": 8, "method": "call", "params": ["' + sysauth+'", "network.interface", "dump",{}]},' +\
-            '{"jsonrpc": "2.0", "id": 9, "method": "call", "params": ["' + sysauth+'", "luci-rpc", "getNetworkDevices",{}]},' +\
-            '{"jsonrpc": "2.0", "id": 10, "method": "call", "params": ["' + sysauth + '", "luci", "getRealtimeStats",{"mode":"interface","device":"br-lan"}]}]'
-
-        # postData = json.dumps(json.loads(postData), sort_keys=True, indent=4, separators=(',', ': '))
-        postData = json.dumps(json.loads(postData))
+    @property
+    def tier_intervals(self):
+        """Return the polling interval of each tier, in seconds."""
+        return dict(self._tier_intervals)
+
+    def _due_tiers(self):
+        """Return the tiers whose interval has elapsed; fast is due every poll."""
+        now = time.monotonic()
+        # 协调器的刷新时刻有抖动，留出一秒余量
+        return {
+            tier for tier, next_due in self._tier_next_due.items()
+            if tier == TIER_FAST or now + 1 >= next_due
+        }
 
-        header = {
-            "Content-Type": "application/json",
-            "Content-Length": str(len(postData))
+    def _tiers_done(self, tiers):
+        now = time.monotonic()
+        for tier in tiers:
+            interval = self._tier_intervals[tier]
+            if tier in self._event_covered:
+                # 有事件推送时，轮询只作兜底
+                interval *= EVENT_COVERED_FACTOR
+            self._tier_next_due[tier] = now + interval
+
+    def set_event_covered(self, tier, covered: bool):
+        """Poll a tier less often while ubus events report its changes."""
+        if covered:
+            self._event_covered.add(tier)
+        else:
+            self._event_covered.discard(tier)
+
+    def refresh_tier(self, tier=None):
+        """Make a tier (or every tier) due on the next poll."""
+        for name in self._tier_next_due:
+            if tier is None or name == tier:
+                self._tier_next_due[name] = 0
+
+    def _add_status_calls(self, batch: UbusBatch, tiers):
+        """Add the status calls of the due tiers to a batch, return their handles by name."""
+        # 没有提取器读取的调用不发送
+        extracted = extracted_calls()
+        return {
+            name: batch.add(obj, method, params)
+            for name, (tier, obj, method, params) in STATUS_CALLS.items()
+            if tier in tiers and name in extracted and name not in self._pruned_calls
         }
 
-        url = self._host + "/ubus/"
+    @staticmethod
+    def _status_result(results, calls, name):
+        """Return the result of a status call, a failed one if it was not due this poll."""
+        if name not in calls:
+            return NOT_POLLED
+        return results[calls[name]]
+
+    async def _get_openwrt_status(self, sysauth, deadline=None):
+        """Poll the due status calls, return the fresh values, 401, or None on failure."""
+        if deadline is None:
+            deadline = Deadline()
+
+        # 只请求到期的分级；开关状态的 uci 读取和状态调用放在同一个批量请求中，一次往返完成
+        tiers = self._due_tiers()
+        batch = UbusBatch()
+        calls = self._add_status_calls(batch, tiers)
+        switch_calls = self._add_switch_calls(batch)
+        self._poll_stats["last_poll_calls"] = len(batch)
+        self._poll_stats["last_poll_tiers"] = sorted(tiers)
 
         try:
-            async with timeout(REQUEST_TIMEOUT):
-                resdatas = await self._hass.async_add_executor_job(self.requestpost_json2, url, header, postData)
+            async with deadline.timeout():
+                results = await self.async_call_batch(batch, sysauth, deadline, "status")
                 
         except asyncio.TimeoutError:
-            _LOGGER.error("Timeout fetching _get_openwrt_status data (timeout=%ds)", REQUEST_TIMEOUT)
-            # 超时时保持之前的数据不变
-            self._data = current_data.copy()
-            # 更新querytime为当前时间
-            querytime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self._data["querytime"] = querytime
-            # 标记数据为旧数据
-            self._data["openwrt_isold"] = True
-            return
+            _LOGGER.error("Timeout fetching _get_openwrt_status data (timeout=%ds)", deadline.budget)
+            return None
         
-        except (ClientConnectorError) as error:
+        except ClientError as error:
             _LOGGER.error("Error fetching _get_openwrt_status data: %s", error)
-            # raise UpdateFailed(error)
-            self._data = current_data.copy()
-            # 更新querytime为当前时间
-            querytime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self._data["querytime"] = querytime
-            # 标记数据为旧数据
-            self._data["openwrt_isold"] = True
-            return
+            return None
+
+        if results == 401 or results == 403:
+            _LOGGER.debug("_get_openwrt_status async_call_batch: %s", results)
+            return 401
+
+        if isinstance(results, int):
+            _LOGGER.error("Error fetching _get_openwrt_status data: http status %s", results)
+            return None
+
+        # 只包含本次轮询到的值，未到期的分级在快照中沿用上一次的分区
+        values = {}
+        self._parse_openwrt_status(results, calls, values)
+        self._parse_switch_state(results, switch_calls, values)
+        self._tiers_done(tiers)
+        return values
+
+    @property
+    def supported_switches(self):
+        """Return the switches whose uci config exists on the router."""
+        return [
+            switch for switch in SWITCH_TYPES
+            if self._capabilities.has_config(SWITCH_TYPES[switch]["config"])
+        ]
+
+    def _add_switch_calls(self, batch: UbusBatch):
+        """Add one uci read per switch to a batch, return handles by switch name."""
+        return {
+            SWITCH_TYPES[switch]["name"]: batch.add("uci", "get", {
+                "config": SWITCH_TYPES[switch]["config"],
+                "section": SWITCH_TYPES[switch]["section"],
+                "option": SWITCH_TYPES[switch]["option"],
+            })
+            for switch in self.supported_switches
+        }
 
-        # _LOGGER.debug("Requests remaining: %s", url)
+    def _parse_switch_state(self, results, switch_calls, values):
+        """Fill values["switch"] from the uci reads."""
+        values["switch"] = []
+        for switch in self.supported_switches:
+            name = SWITCH_TYPES[switch]["name"]
+            result = results[switch_calls[name]]
+            value = result.data.get("value") if result.ok else None
+            onoff = "on" if value == SWITCH_TYPES[switch]["turn_on_body"] else "off"
+            values["switch"].append({"name": name, "onoff": onoff})
+
+    def _parse_openwrt_status(self, results, calls, values):
+        """Fill values from the status call results, see extractors.py."""
+        self._poll_stats.update(extract(results, calls, self._last_good, values))
+
+        result = self._status_result(results, calls, "board")
+        if result.ok:
+            self._firmware = firmware_id(result.data)
+
+    async def requestpost_token(self, url, data_body, deadline=None):
+        header = {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36",
+            "Cookie": "sysauth_http=" + self._session_,
+            "Content-Length": str(len(data_body))
+        }
+        status, body = await self.async_request("POST", url, header, deadline=deadline, data=data_body)
+        if status == 403:
+            _LOGGER.error("Current function requestpost_token, error code %s", status)
+            _LOGGER.debug("Current function requestpost_token, url: %s", url)
+            _LOGGER.debug("Current function requestpost_token, data_body: %s", data_body)
+            _LOGGER.debug("Current function requestpost_token, header: %s", header)
+        if status != 200:
+            return status
+        resdata = self.decode_json(body, "apply_rollback")
+        self._token_task_ = resdata["token"]
+
+        _LOGGER.info(type(resdata))
+        _LOGGER.debug("requestpost_token resdata : %s", resdata)
+        _LOGGER.debug("requestpost_token self._token_ : %s", self._token_)
+        return resdata
 
-        if resdatas == 401 or resdatas == 403:
-            self._data = 401
-            _LOGGER.debug("_get_openwrt_status requestpost_json2: %s", self._data)
-            return
+    async def requestpost_confirm(self, url, data_body, deadline=None):
+        header = {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36",
+            "Cookie": "sysauth_http=" + self._session_,
+            "Content-Length": str(len(data_body))
+        }
+        status, body = await self.async_request("POST", url, header, deadline=deadline, data=data_body)
+        if status == 403:
+            _LOGGER.error(url)
+            _LOGGER.error(data_body)
+            _LOGGER.error(header)
+        if status != 200:
+            return status
+        responsedata = body.decode('utf-8')
+
+        if responsedata == "OK":
+            return True
+        return False
 
-        self._data = {}
-
-        for resdata in resdatas:
-            if resdata["id"] == 1:
-                # _LOGGER.debug("Id 1 - Start")
-                self._data["openwrt_uptime"] = self.seconds_to_dhms(resdata["result"][1]["uptime"])
-
-                self._data["openwrt_memory"] = round((1 - resdata["result"][1]["memory"]["available"]/resdata["result"][1]["memory"]["total"])*100, 0)
-                self._data["openwrt_memory_attrs"] = resdata["result"][1]["memory"]
-
-                self._data["openwrt_memory_total"] = resdata["result"][1]["memory"]["total"]
-                self._data["openwrt_memory_free"] = resdata["result"][1]["memory"]["free"]
-                self._data["openwrt_memory_shared"] = resdata["result"][1]["memory"]["shared"]
-                self._data["openwrt_memory_buffered"] = resdata["result"][1]["memory"]["buffered"]
-                self._data["openwrt_memory_available"] = resdata["result"][1]["memory"]["available"]
-                self._data["openwrt_memory_cached"] = resdata["result"][1]["memory"]["cached"]
-
-                self._data["openwrt_memory_total_gb"] = round(resdata["result"][1]["memory"]["total"]/1024/1024/1024, 3)
-                self._data["openwrt_memory_free_gb"] = round(resdata["result"][1]["memory"]["free"]/1024/1024/1024, 3)
-                self._data["openwrt_memory_shared_gb"] = round(resdata["result"][1]["memory"]["shared"]/1024/1024/1024, 3)
-                self._data["openwrt_memory_buffered_gb"] = round(resdata["result"][1]["memory"]["buffered"]/1024/1024/1024, 3)
-                self._data["openwrt_memory_available_gb"] = round(resdata["result"][1]["memory"]["available"]/1024/1024/1024, 3)
-                self._data["openwrt_memory_cached_gb"] = round(resdata["result"][1]["memory"]["cached"]/1024/1024/1024, 3)
-                # _LOGGER.debug("Id 1 - End")
-
-            elif resdata["id"] == 2:
-                # _LOGGER.debug("Id 2 - Start")
-                cpuinfo = resdata["result"][1]["cpuinfo"]
-                self._data["openwrt_cputemp"] = 0
-                # _LOGGER.debug("Id 2 - End")
-
-            elif resdata["id"] == 3:
-                # _LOGGER.debug("Id 3 - Start")
-                self._data["openwrt_cpu"] = resdata["result"][1]["cpuusage"].replace("%", "")
-                # _LOGGER.debug("Id 3 - End")
-
-            elif resdata["id"] == 5:
-                # _LOGGER.debug("Id 5 - Start")
-                self._data["openwrt_conncount"] = resdata["result"][1]["data"].replace("\n", "")
-                # _LOGGER.debug("Id 5 - End")
-
-            elif resdata["id"] == 6:
-                # _LOGGER.debug("Id 6- Start")
-                self._data["openwrt_user_online"] = resdata["result"][1]["onlineusers"]
-                # _LOGGER.debug("Id 6 - End")
-
-            elif resdata["id"] == 7:
-                # _LOGGER.debug("Id 7 - Start")
-                if resdata["result"][1].get("wan"):
-                    self._data["openwrt_wan_ip"] = resdata["result"][1]["wan"]["ipaddr"]
-                    self._data["openwrt_wan_ip_attrs"] = resdata["result"][1]["wan"]
-                    try:
-                        self._data["openwrt_wan_uptime"] = self.seconds_to_dhms(resdata["result"][1]["wan"]["uptime"])
-                    except Exception:
-                        self._data["openwrt_wan_uptime"] = resdata["result"][1]["wan"]["uptime"]
-                else:
-                    self._data["openwrt_wan_ip"] = ""
-                    self._data["openwrt_wan_uptime"] = ""
+    async def passwall_check(self, deadline=None):
+        if deadline is None:
+            deadline = Deadline(priority=PRIORITY_USER)
+        batch = UbusBatch()
+        enabled = batch.add("uci", "get", {"config": "passwall", "section": "@global[0]", "option": "enabled"})
+        
+        _LOGGER.debug("Current function passwall_check , _session_ : %s", self._session_)
+        _LOGGER.debug("Current function passwall_check , _token_ : %s", self._token_)
+        
 
-                if resdata["result"][1].get("wan6"):
-                    self._data["openwrt_wan6_ip"] = resdata["result"][1]["wan6"]["ipaddr"]
-                    self._data["openwrt_wan6_ip_attrs"] = resdata["result"][1]["wan6"]
-                    try:
-                        self._data["openwrt_wan6_uptime"] = self.seconds_to_dhms(resdata["result"][1]["wan6"]["uptime"])
-                    except Exception:
-                        self._data["openwrt_wan6_uptime"] = resdata["result"][1]["wan6"]["uptime"]
+        if not self.allow_login:
+            _LOGGER.error("Current function passwall_check, login is backing off")
+            return False
 
-                else:
-                    self._data["openwrt_wan6_ip"] = ""
-                    self._data["openwrt_wan6_uptime"] = ""
-                # _LOGGER.debug("Id 7 - End")
-
-            elif resdata["id"] == 8:
-                # _LOGGER.debug("Id 8 - Start")
-                if self._data["openwrt_wan_ip"] == "":
-                    for ress in resdata["result"][1]["interface"]:
-                        if ress["interface"] == "lan":
-                            self._data["openwrt_wan_ip"] = ress["ipv4-address"][0]["address"]
-                            self._data["openwrt_wan_uptime"] = self.seconds_to_dhms(ress["uptime"])
-                # _LOGGER.debug("Id 8 - End")
-
-            elif resdata["id"] == 9:
-                # _LOGGER.debug("Id 9 - Start")
-                self._data["openwrt_rx"] = self.hum_convert_nounit(resdata["result"][1]["br-lan"]["stats"]["rx_bytes"])
-                self._data["openwrt_tx"] = self.hum_convert_nounit(resdata["result"][1]["br-lan"]["stats"]["tx_bytes"])
-                # _LOGGER.debug("Id 9 - End")
-
-            elif resdata["id"] == 10:
-                # _LOGGER.debug("Id 10 - Start")
-                jsonTmp = resdata["result"][1]["result"]
-                self._data["openwrt_rx_packets"] = self.speed_convert_nounit((jsonTmp[1][1] - jsonTmp[0][1])/(jsonTmp[1][0] - jsonTmp[0][0]))
-                self._data["openwrt_tx_packets"] = self.speed_convert_nounit((jsonTmp[1][3] - jsonTmp[0][1])/(jsonTmp[1][3] - jsonTmp[0][0]))
-                # _LOGGER.debug("Id 10 - End")
-
-        querytime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self._data["openwrt_isold"] = False
-        self._data["querytime"] = querytime
-
-        # _LOGGER.debug(querytime)
-        return
+        try:
+            async with deadline.timeout():
+                results = await self.async_call_batch(batch, self._session_, deadline, "uci")
+                
+        except ClientError as error:
+            raise UpdateFailed(error)
+        
+        except asyncio.TimeoutError:
+            _LOGGER.error("Timeout fetching passwall_check data (timeout=%ds)", deadline.budget)
+            return False
 
-    async def get_openwrt_version(self, sysauth):
-        body = '[{"jsonrpc": "2.0", "id": 41, "method": "call", "params": ["' + sysauth + '", "system", "board", {}]}]'
+        if isinstance(results, int) or not results[enabled].ok:
+            return False
 
-        header = {
-            "Content-Type": "application/json",
-            "Content-Length": str(len(body))
-        }
+        if results[enabled].data.get("value") == "1":
+            return "on"
+        else:
+            return "off"
+
+    async def passwall_ischange(self, deadline=None):
+        if deadline is None:
+            deadline = Deadline(priority=PRIORITY_USER)
+        batch = UbusBatch()
+        changes = batch.add("uci", "changes")
+
+        _LOGGER.debug("Current function passwall_ischange , _session_ : %s", self._session_)
+        _LOGGER.debug("Current function passwall_ischange , _token_ : %s", self._token_)
+        
+        if not self.allow_login:
+            _LOGGER.error("Current function passwall_ischange, login is backing off")
+            return False
 
-        url = self._host + "/ubus/"
         try:
-            async with timeout(REQUEST_TIMEOUT):
-                resdata = await self._hass.async_add_executor_job(self.requestpost_json2, url, header, body)
+            async with deadline.timeout():
+                results = await self.async_call_batch(batch, self._session_, deadline, "uci")
                 
+        except ClientError as error:
+            raise UpdateFailed(error)
+        
         except asyncio.TimeoutError:
-            _LOGGER.error("Timeout fetching get_openwrt_version data (timeout=%ds)", REQUEST_TIMEOUT)
-            return
+            _LOGGER.error("Timeout fetching passwall_ischange data (timeout=%ds)", deadline.budget)
+            return False
+
+        if isinstance(results, int) or not results[changes].ok:
+            return False
+
+        if results[changes].data.get("changes", {}) == {}:
+            return False
+        else:
+            return True
+
+    async def passwall_action(self, action_body, deadline=None):
+        if deadline is None:
+            deadline = Deadline(priority=PRIORITY_USER)
+        batch = UbusBatch()
+        action = batch.add("uci", "set", {"config": "passwall", "section": "@global[0]", "values": {"enabled": str(action_body)}})
         
-        except (ClientConnectorError) as error:
-            _LOGGER.error("Error fetching get_openwrt_version data: %s", error)
+        if not self.allow_login:
+            _LOGGER.error("Current function passwall_action, login is backing off")
+            return False
+
+        _LOGGER.debug("Current function passwall_action , _session_ : %s", self._session_)
+        _LOGGER.debug("Current function passwall_action , _token_ : %s", self._token_)
+
+        try:
+            async with deadline.timeout():
+                results = await self.async_call_batch(batch, self._session_, deadline, "uci")
+                
+        except ClientError as error:
             raise UpdateFailed(error)
         
-        # _LOGGER.debug("Requests remaining: %s", url)
-        
-        if resdata == 401 or resdata == 403:
-            self._data = 401
-            _LOGGER.debug("get_openwrt_version requestpost_json2: %s", self._data)
-            return
+        except asyncio.TimeoutError:
+            _LOGGER.error("Timeout fetching passwall_action data (timeout=%ds)", deadline.budget)
+            return False
+
+        _LOGGER.debug(results)
+
+        if not isinstance(results, int) and results[action].ok:
+            _LOGGER.info(True)
+            return True
+
+        _LOGGER.info(False)
+        return False
+
+    async def passwall_submit(self, deadline=None):
+        if deadline is None:
+            deadline = Deadline(priority=PRIORITY_USER)
+        postData = "sid=" + self._session_ + "&token=" + self._token_
+
+        url = self._host + "/cgi-bin/luci/admin/uci/apply_rollback"
+        _LOGGER.debug("Current function passwall_submit , _session_ : %s", self._session_)
+        _LOGGER.debug("Current function passwall_submit , _token_ : %s", self._token_)
         
-        openwrtinfo = {}
+        if not self.allow_login:
+            _LOGGER.error("Current function passwall_submit, login is backing off")
+            return False
+
         try:
-            # 提取核心数据节点，减少重复嵌套访问
-            system_core_info = resdata[0]["result"][1]
-        except (IndexError, KeyError, TypeError):
-            # 索引/键不存在、类型错误时，初始化空字典避免后续报错
-            system_core_info = {}
-
-        # 赋值 OpenWRT 信息（get 方法容错，键不存在返回空字符串）
-        openwrtinfo["sw_version"] = system_core_info.get("kernel", "")
-        openwrtinfo["device_name"] = system_core_info.get("hostname", "")
-        openwrtinfo["model"] = system_core_info.get("release", {}).get("description", "").replace("'", "")
-
-        return openwrtinfo
-
-    async def _get_ikuai_switch(self, sysauth, name):
-        resdata = await self._check_openwrt_passwall(sysauth)
-        if resdata:
-            self._data["switch"].append({"name": name, "onoff": "on"})
+            async with deadline.timeout():
+                resdata = await self.requestpost_token(url, postData, deadline=deadline)
+                
+        except ClientError as error:
+            raise UpdateFailed(error)
+        
+        except asyncio.TimeoutError:
+            _LOGGER.error("Timeout fetching passwall_submit data (timeout=%ds)", deadline.budget)
+            return False
+
+        if resdata == 403:
+            return False
+
+        if resdata["token"] != "":
+            return True
         else:
-            self._data["switch"].append({"name": name, "onoff": "off"})
-        return
+            return False
+
+    async def passwall_confrim(self, deadline=None):
+        if deadline is None:
+            deadline = Deadline(priority=PRIORITY_USER)
+        postData = "token=" + self._token_task_
+
+        url = self._host + "/cgi-bin/luci/admin/uci/confirm"
+        _LOGGER.debug("Current function passwall_confrim , _session_ : %s", self._session_)
+        _LOGGER.debug("Current function passwall_confrim , _token_ : %s", self._token_)
+        
+        if not self.allow_login:
+            _LOGGER.error("Current function passwall_confrim, login is backing off")
+            return False
 
-    async def get_data(self, sysauth):
         try:
-            async with timeout(REQUEST_TIMEOUT):
-                tasks = [
-                    asyncio.create_task(self._get_openwrt_status(sysauth)),
-                    asyncio.create_task(self._get_openwrt_passwall(sysauth)),
-                ]
-                await asyncio.gather(*tasks)
+            async with deadline.timeout():
+                resdata = await self.requestpost_confirm(url, postData, deadline=deadline)
+                
+        except ClientError as error:
+            raise UpdateFailed(error)
+        
+        except asyncio.TimeoutError:
+            _LOGGER.error("Timeout fetching passwall_confrim data (timeout=%ds)", deadline.budget)
+            return False
+
+        return resdata is True
+
+    @property
+    def poll_stats(self):
+        """Return timing of the last poll, for diagnostics."""
+        return dict(self._poll_stats)
 
-                self._data["switch"] = []
-                tasks = []
-                for switch in SWITCH_TYPES:
-                    tasks = [
-                        asyncio.create_task(self._get_ikuai_switch(sysauth, SWITCH_TYPES[switch]["name"],)),
-                    ]
-                    await asyncio.gather(*tasks)
+    def _stale_snapshot(self):
+        """Return the last good snapshot marked as old; querytime stays the time of that poll."""
+        return self._last_good.evolve({"openwrt_isold": True})
 
-                self._last_successful_data = self._data.copy()
-                return self._data
+    async def get_data(self, sysauth, deadline=None):
+        if deadline is None:
+            deadline = Deadline()
+        started = time.monotonic()
+        requests_before = self._transport.stats["requests"]
+        try:
+            async with deadline.timeout():
+                # 状态与开关在同一个 ubus 批量请求中；passwall 出口 IP 走 LuCI 页面，只能并行单独请求
+                status = asyncio.create_task(self._get_openwrt_status(sysauth, deadline))
+                tasks = [status]
+                # passwall 出口 IP 很少变化，跟随 medium 分级
+                if TIER_MEDIUM in self._due_tiers() and self._capabilities.has_config("passwall"):
+                    tasks.append(asyncio.create_task(self._get_openwrt_passwall(sysauth, deadline)))
+                await asyncio.gather(*tasks)
+
+                values = status.result()
+                if values == 401:
+                    return 401
+                if values is None:
+                    # 状态请求失败：沿用最近一次成功的快照，旧数据不覆盖它
+                    return self._stale_snapshot()
+
+                values.update(self._passwall_data)
+                values["openwrt_isold"] = False
+                # epoch 秒，由时间戳传感器显示
+                values["querytime"] = int(time.time())
+                previous = self._last_good
+                self._last_good = previous.evolve(values)
+                self._poll_stats["last_poll_sections_reused"] = self._last_good.shared_sections(previous)
+                return self._last_good
 
         except asyncio.TimeoutError:
-            _LOGGER.error("Timeout fetching get_openwrt_data (timeout=%ds), returning last successful data", REQUEST_TIMEOUT)
-            
-            if self._last_successful_data:
-                self._data = self._last_successful_data.copy()
-                self._data["openwrt_isold"] = True
-                return self._data
+            _LOGGER.error("Timeout fetching get_openwrt_data (timeout=%ds), returning last successful data", deadline.budget)
             
-            _LOGGER.error("No last successful data available, returning default data")
-            return self._default_data
+            if self._last_good:
+                return self._stale_snapshot()
             
             raise UpdateFailed("Timeout fetching data and no cached data available")
         
-        except requests.exceptions.RequestException as error:
+        except ClientError as error:
             _LOGGER.error("Request error fetching get_openwrt_data: %s, returning last successful data", error)
             
-            if self._last_successful_data:
-                self._data = self._last_successful_data.copy()
-                self._data["openwrt_isold"] = True
-                return self._data
+            if self._last_good:
+                return self._stale_snapshot()
             
             raise UpdateFailed(f"Request error fetching data: {error}")
 
+        finally:
+            self._poll_stats["polls"] += 1
+            self._poll_stats["last_poll_duration"] = round(time.monotonic() - started, 3)
+            self._poll_stats["last_poll_round_trips"] = self._transport.stats["requests"] - requests_before
+
     # async def get_data(self, sysauth):
     #     # 顺序执行，避免并发请求路由器导致超时
     #     await self._get_openwrt_status(sysauth)
     #     await self._get_openwrt_passwall(sysauth)
 
-    #     self._data["switch"] = []
-    #     for switch in SWITCH_TYPES:
-    #         await self._get_ikuai_switch(sysauth, SWITCH_TYPES[switch]["name"])
-
     #     return self._data
     
 class GetDataError(Exception):
@@ -0,0 +1,57 @@
+"""Diagnostics support for openwrt."""
+from __future__ import annotations
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    CONF_PASSWD,
+    CONF_SSL_FINGERPRINT,
+    CONF_USERNAME,
+    COORDINATOR,
+    DOMAIN,
+    FETCHER,
+)
+
+TO_REDACT = {
+    CONF_USERNAME,
+    CONF_PASSWD,
+    CONF_SSL_FINGERPRINT,
+    "openwrt_wan_ip",
+    "openwrt_wan6_ip",
+    "openwrt_wan_ip_attrs",
+    "openwrt_wan6_ip_attrs",
+    "openwrt_passwall_ip",
+}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Return diagnostics for a config entry."""
+    entry_data = hass.data[DOMAIN][entry.entry_id]
+    coordinator = entry_data[COORDINATOR]
+    fetcher = entry_data[FETCHER]
+
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": async_redact_data(dict(entry.options), TO_REDACT),
+        },
+        "last_update_success": coordinator.last_update_success,
+        "startup": coordinator.startup_stats,
+        "poll": fetcher.poll_stats,
+        "interval": coordinator.interval_stats,
+        "refresh": coordinator.refresh_stats,
+        "dispatch": coordinator.dispatch_stats,
+        "breaker": fetcher.breaker.stats,
+        "events": coordinator.events.stats if coordinator.events is not None else None,
+        "capabilities": fetcher.capability_stats,
+        "connection": fetcher.connection_stats,
+        "session": fetcher.session_stats,
+        "decode": fetcher.decode_stats,
+        "limiter": fetcher.limiter_stats,
+        "fleet": fetcher.fleet.stats(entry.entry_id) if fetcher.fleet is not None else None,
+        "retry": fetcher.retry_stats,
+        "cache": fetcher.cache_stats,
+        "data": async_redact_data(coordinator.data.as_dict() if coordinator.data else {}, TO_REDACT),
+    }
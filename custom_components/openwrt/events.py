@@ -0,0 +1,168 @@
+"""
+push updates from ubus events over the uhttpd /ubus/subscribe endpoint
+"""
+
+import asyncio
+import logging
+
+from aiohttp.client_exceptions import ClientError
+from homeassistant.helpers.update_coordinator import UpdateFailed
+
+from .const import (
+    EVENT_OBJECTS,
+    EVENT_RESUBSCRIBE_MAX,
+    TIER_SLOW,
+    UBUS_URL,
+)
+from .transport import Deadline
+
+_LOGGER = logging.getLogger(__name__)
+
+# 事件能覆盖其变化的轮询分级
+EVENT_TIERS = {"network.interface": TIER_SLOW}
+
+
+class UbusEventsUnsupported(Exception):
+    """The router's uhttpd has no ubus subscribe support."""
+
+
+async def iter_sse(response):
+    """Yield (event type, data text) from a server-sent events stream."""
+    event = "message"
+    data = []
+    async for raw in response.content:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event = "message"
+            data = []
+        elif line.startswith(":"):
+            continue
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
+
+
+class UbusEventListener:
+    """Subscribe to network.interface and hostapd.* notifications.
+
+    Each object gets its own event stream; a dropped stream is resubscribed
+    with exponential backoff, and while it is down the regular polling
+    covers its data. If the router does not support subscriptions the
+    listener stops for good and polling stays as configured.
+    """
+
+    def __init__(self, hass, fetcher, on_event) -> None:
+        self._hass = hass
+        self._fetcher = fetcher
+        self._on_event = on_event
+        self._tasks = []
+        self._connected = set()
+        self._stats = {"events": 0, "resubscribes": 0, "supported": None}
+
+    @property
+    def stats(self):
+        """Return subscription state, for diagnostics."""
+        stats = dict(self._stats)
+        stats["subscribed"] = sorted(self._connected)
+        return stats
+
+    def is_subscribed(self, obj: str) -> bool:
+        """Return True while the event stream of an object is up."""
+        return obj in self._connected
+
+    def start(self):
+        """Start subscribing in the background."""
+        self._tasks.append(
+            self._hass.async_create_background_task(self._async_run(), f"openwrt events {self._fetcher.host}")
+        )
+
+    async def async_stop(self):
+        """Close every event stream."""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._tasks = []
+        self._connected.clear()
+
+    async def _async_run(self):
+        objects = list(EVENT_OBJECTS)
+        # hostapd 对象名随无线接口变化（hostapd.wlan0、hostapd.phy0-ap0...），要先登录才能列出
+        delay = 1
+        while True:
+            try:
+                sysauth = await self._fetcher.get_access_token(Deadline())
+            except (ClientError, asyncio.TimeoutError, UpdateFailed) as error:
+                _LOGGER.debug("event listener login failed: %s", error)
+                sysauth = None
+            if sysauth is not None:
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, EVENT_RESUBSCRIBE_MAX)
+        objects += await self._fetcher.async_list_objects("hostapd.*", sysauth)
+
+        for obj in objects:
+            self._tasks.append(
+                self._hass.async_create_background_task(self._async_subscribe_loop(obj), f"openwrt events {obj}")
+            )
+
+    async def _async_subscribe_loop(self, obj):
+        delay = 1
+        while True:
+            try:
+                await self._async_subscribe(obj)
+                delay = 1
+            except UbusEventsUnsupported:
+                _LOGGER.info("%s does not support ubus event subscription, keep polling", self._fetcher.host)
+                self._stats["supported"] = False
+                return
+            except (ClientError, asyncio.TimeoutError, UpdateFailed) as error:
+                _LOGGER.debug("event stream of %s dropped: %s", obj, error)
+            finally:
+                self._connected.discard(obj)
+                if obj in EVENT_TIERS:
+                    # 断开期间可能漏掉事件：恢复正常轮询并立即补一次
+                    self._fetcher.set_event_covered(EVENT_TIERS[obj], False)
+                    self._fetcher.refresh_tier(EVENT_TIERS[obj])
+
+            self._stats["resubscribes"] += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, EVENT_RESUBSCRIBE_MAX)
+
+    async def _async_subscribe(self, obj):
+        sysauth = await self._fetcher.get_access_token(Deadline())
+        if sysauth is None:
+            raise asyncio.TimeoutError
+
+        url = self._fetcher.host + UBUS_URL + "subscribe/" + obj
+        headers = {
+            "Accept": "text/event-stream",
+            "Authorization": "Bearer " + sysauth,
+        }
+        async with self._fetcher.async_stream(url, headers) as response:
+            if response.status in (400, 404, 501):
+                raise UbusEventsUnsupported
+            if response.status in (401, 403):
+                self._fetcher.invalidate_token()
+                raise ClientError(f"subscribe {obj}: http {response.status}")
+            if response.status != 200:
+                raise ClientError(f"subscribe {obj}: http {response.status}")
+
+            self._stats["supported"] = True
+            self._connected.add(obj)
+            if obj in EVENT_TIERS:
+                self._fetcher.set_event_covered(EVENT_TIERS[obj], True)
+            _LOGGER.debug("subscribed to %s events", obj)
+            async for event, text in iter_sse(response):
+                try:
+                    data = self._fetcher.decode_json(text.encode("utf-8"), "event")
+                except ValueError:
+                    continue
+                self._stats["events"] += 1
+                self._on_event(obj, event, data if isinstance(data, dict) else {})
@@ -0,0 +1,261 @@
+"""
+extractors: turn status call results into snapshot values
+
+Each extractor reads the result of one status call (a name in
+data_fetcher.STATUS_CALLS) and fills a fixed set of snapshot keys. Several
+extractors can read the same call, the call is still sent once per poll.
+An extractor that raises, or whose call returned a ubus error, only marks
+its own keys unavailable; every other key of the poll is kept.
+
+Adding a metric:
+
+    @extractor("system_info", "openwrt_swap")
+    def _swap(data, context):
+        return {"openwrt_swap": data["swap"]["free"]}
+"""
+
+import logging
+import time
+
+from .const import TIMESTAMP_TOLERANCE
+
+_LOGGER = logging.getLogger(__name__)
+
+# 解析 ubus 返回值时可能出现的错误：缺键、类型不符、空列表、除零
+EXTRACT_ERRORS = (KeyError, IndexError, TypeError, ValueError, AttributeError, ZeroDivisionError)
+
+
+class Extractor:
+    """One status call -> the snapshot keys it fills."""
+
+    __slots__ = ("call", "keys", "func")
+
+    def __init__(self, call: str, keys: tuple, func) -> None:
+        self.call = call
+        self.keys = keys
+        self.func = func
+
+    def __repr__(self):
+        return f"Extractor({self.call}, {self.func.__name__})"
+
+
+# 按注册顺序执行，后面的提取器可以读取前面的结果（context.values）
+EXTRACTORS = []
+
+
+def extractor(call: str, *keys):
+    """Register the decorated function as the extractor of keys from a status call."""
+    def register(func):
+        EXTRACTORS.append(Extractor(call, keys, func))
+        return func
+    return register
+
+
+def extracted_calls():
+    """Return the names of the status calls some extractor reads."""
+    return {item.call for item in EXTRACTORS}
+
+
+class Context:
+    """What an extractor may read besides its own call result."""
+
+    __slots__ = ("previous", "values")
+
+    def __init__(self, previous, values: dict) -> None:
+        # 上一次成功轮询的快照，以及本次轮询已提取的值
+        self.previous = previous
+        self.values = values
+
+    def since(self, key, seconds):
+        """Return the epoch time `seconds` ago, or the previous value of key if it is within the tolerance.
+
+        Boot and connect times are computed from an uptime, so every poll
+        lands a second or two apart; keeping the previous value avoids a
+        state change on every poll.
+        """
+        if not isinstance(seconds, (int, float)):
+            return None
+        since = int(time.time() - seconds)
+        previous = self.previous.get(key)
+        if isinstance(previous, int) and abs(since - previous) <= TIMESTAMP_TOLERANCE:
+            return previous
+        return since
+
+
+def extract(results, calls, previous, values: dict):
+    """Run every extractor whose call was polled, fill values, return the stats.
+
+    results/calls are the batch results and the {name: handle} of the
+    polled status calls. values gets the extracted keys, the keys of failed
+    extractors set to None, and "unavailable": the keys whose last
+    extraction failed, including those of calls not polled this time.
+    """
+    context = Context(previous, values)
+    ran = set()
+    failed = set()
+    errors = 0
+    for item in EXTRACTORS:
+        if item.call not in calls:
+            continue
+        ran.update(item.keys)
+        result = results[calls[item.call]]
+        if not result.ok:
+            failed.update(item.keys)
+            continue
+        try:
+            extracted = item.func(result.data, context)
+        except EXTRACT_ERRORS as err:
+            _LOGGER.debug("extractor %s failed: %r", item.func.__name__, err)
+            errors += 1
+            failed.update(item.keys)
+            continue
+        values.update(extracted)
+
+    # 同一个键可能由多个提取器填写，只要有一个成功就可用
+    failed -= values.keys()
+    for key in failed:
+        values[key] = None
+    unavailable = (set(previous.get("unavailable", ())) - ran) | failed
+    values["unavailable"] = tuple(sorted(unavailable))
+    return {"extractors_failed": errors, "keys_unavailable": len(unavailable)}
+
+
+@extractor("system_info", "openwrt_uptime")
+def _boot_time(data, context):
+    return {"openwrt_uptime": context.since("openwrt_uptime", data["uptime"])}
+
+
+@extractor("system_info", "openwrt_load")
+def _load(data, context):
+    # 1 分钟平均负载，ubus 按 65536 定点数返回
+    return {"openwrt_load": round(data["load"][0] / 65536, 2)}
+
+
+@extractor(
+    "system_info",
+    "openwrt_memory",
+    "openwrt_memory_attrs",
+    "openwrt_memory_total",
+    "openwrt_memory_free",
+    "openwrt_memory_shared",
+    "openwrt_memory_buffered",
+    "openwrt_memory_available",
+    "openwrt_memory_cached",
+)
+def _memory(data, context):
+    memory = data["memory"]
+    return {
+        "openwrt_memory": round((1 - memory["available"]/memory["total"])*100, 0),
+        "openwrt_memory_attrs": memory,
+        "openwrt_memory_total": memory["total"],
+        "openwrt_memory_free": memory["free"],
+        "openwrt_memory_shared": memory["shared"],
+        "openwrt_memory_buffered": memory["buffered"],
+        "openwrt_memory_available": memory["available"],
+        "openwrt_memory_cached": memory["cached"],
+    }
+
+
+@extractor("cpu_info", "openwrt_cputemp")
+def _cpu_temperature(data, context):
+    # 温度尚未从 cpuinfo 解析，只确认调用返回了 cpuinfo；占位值不进入长期统计（无 state_class）
+    if "cpuinfo" not in data:
+        raise KeyError("cpuinfo")
+    return {"openwrt_cputemp": 0}
+
+
+@extractor("cpu_usage", "openwrt_cpu")
+def _cpu_usage(data, context):
+    return {"openwrt_cpu": float(data["cpuusage"].replace("%", ""))}
+
+
+@extractor("conncount", "openwrt_conncount")
+def _conncount(data, context):
+    return {"openwrt_conncount": int(data["data"])}
+
+
+@extractor("online_users", "openwrt_user_online")
+def _online_users(data, context):
+    return {"openwrt_user_online": data["onlineusers"]}
+
+
+# uci 配置里没有 uptime，连接时间取自 network.interface dump；
+# DHCP/PPPoE 的 wan 在 uci 中没有 ipaddr，实际地址也以 dump 为准
+@extractor("network_config", "openwrt_wan_ip", "openwrt_wan_ip_attrs")
+def _wan_config(data, context):
+    if not data.get("wan"):
+        return {"openwrt_wan_ip": ""}
+    return {"openwrt_wan_ip": data["wan"].get("ipaddr", ""), "openwrt_wan_ip_attrs": data["wan"]}
+
+
+@extractor("network_config", "openwrt_wan6_ip", "openwrt_wan6_ip_attrs")
+def _wan6_config(data, context):
+    if not data.get("wan6"):
+        return {"openwrt_wan6_ip": ""}
+    return {"openwrt_wan6_ip": data["wan6"].get("ipaddr", ""), "openwrt_wan6_ip_attrs": data["wan6"]}
+
+
+@extractor("interface_dump", "openwrt_wan_ip", "openwrt_wan6_ip")
+def _wan_address(data, context):
+    # 接口已连接且有地址时使用当前地址，断开时为空
+    values = {}
+    for ress in data["interface"]:
+        if ress["interface"] == "wan":
+            addresses = ress.get("ipv4-address") or []
+            values["openwrt_wan_ip"] = addresses[0]["address"] if ress.get("up") and addresses else ""
+        elif ress["interface"] == "wan6":
+            addresses = ress.get("ipv6-address") or []
+            values["openwrt_wan6_ip"] = addresses[0]["address"] if ress.get("up") and addresses else ""
+    return values
+
+
+@extractor("interface_dump", "openwrt_wan_uptime", "openwrt_wan6_uptime")
+def _connect_time(data, context):
+    values = {}
+    for ress in data["interface"]:
+        key = {"wan": "openwrt_wan_uptime", "wan6": "openwrt_wan6_uptime"}.get(ress["interface"])
+        if key:
+            # 接口未连接时没有 uptime，连接时间为空
+            values[key] = context.since(key, ress["uptime"]) if ress.get("up") and "uptime" in ress else None
+    return values
+
+
+@extractor("interface_dump", "openwrt_wan_ip", "openwrt_wan_uptime")
+def _lan_fallback(data, context):
+    # wan 没有地址时显示 lan 接口；在 _connect_time 之后注册，wan 断开时不会被清空的连接时间覆盖
+    values = {}
+    if context.values.get("openwrt_wan_ip", context.previous.get("openwrt_wan_ip", "")) == "":
+        for ress in data["interface"]:
+            if ress["interface"] == "lan":
+                values["openwrt_wan_ip"] = ress["ipv4-address"][0]["address"]
+                values["openwrt_wan_uptime"] = context.since("openwrt_wan_uptime", ress["uptime"])
+    return values
+
+
+@extractor("network_devices", "openwrt_rx", "openwrt_tx")
+def _traffic(data, context):
+    # 字节计数，由 HA 按 suggested_unit_of_measurement 换算显示
+    stats = data["br-lan"]["stats"]
+    return {"openwrt_rx": stats["rx_bytes"], "openwrt_tx": stats["tx_bytes"]}
+
+
+@extractor("realtime_stats", "openwrt_rx_packets", "openwrt_tx_packets")
+def _traffic_rate(data, context):
+    # 每行为 [时间, 接收字节, 接收包, 发送字节, 发送包]，取最近两次采样的差值，单位 B/s
+    # luci-bwc 的历史按时间从旧到新排列，最后两行是最新采样
+    samples = data["result"]
+    elapsed = samples[-1][0] - samples[-2][0]
+    return {
+        "openwrt_rx_packets": round((samples[-1][1] - samples[-2][1])/elapsed, 1),
+        "openwrt_tx_packets": round((samples[-1][3] - samples[-2][3])/elapsed, 1),
+    }
+
+
+@extractor("board", "sw_version", "device_name", "model")
+def _board(data, context):
+    # get 方法容错，键不存在返回空字符串
+    return {
+        "sw_version": data.get("kernel", ""),
+        "device_name": data.get("hostname", ""),
+        "model": data.get("release", {}).get("description", "").replace("'", ""),
+    }
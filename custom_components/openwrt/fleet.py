@@ -0,0 +1,111 @@
+"""
+domain-wide scheduler that staggers the polls of many routers
+"""
+
+import asyncio
+import time
+
+from .const import (
+    DOMAIN,
+    FLEET,
+    FLEET_MAX_CONCURRENT,
+)
+
+
+def get_fleet(hass):
+    """Return the scheduler shared by every openwrt entry."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if FLEET not in domain_data:
+        domain_data[FLEET] = FleetScheduler()
+    return domain_data[FLEET]
+
+
+class FleetScheduler:
+    """Spread the polls of all entries across their interval.
+
+    Each entry gets a phase, its share of the interval by registration
+    order, and polls on a wall-clock grid shifted by that phase, so N
+    routers with the same interval poll 1/N of the interval apart instead
+    of on the same second. A global semaphore caps the requests in flight
+    toward all routers together.
+    """
+
+    def __init__(self, max_concurrent: int = FLEET_MAX_CONCURRENT) -> None:
+        self._entries = []
+        self._scheduled = {}
+        self._lag = {}
+        self._max_concurrent = max_concurrent
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._in_flight = 0
+        self._stats = {"requests": 0, "waited": 0, "max_in_flight": 0}
+
+    def register(self, entry_id):
+        """Add an entry; phases of the others shift to make room."""
+        if entry_id not in self._entries:
+            self._entries.append(entry_id)
+
+    def unregister(self, entry_id):
+        """Remove an entry on unload."""
+        if entry_id in self._entries:
+            self._entries.remove(entry_id)
+        self._scheduled.pop(entry_id, None)
+        self._lag.pop(entry_id, None)
+
+    def phase(self, entry_id, interval: float) -> float:
+        """Return the offset of an entry inside the interval, in seconds."""
+        if entry_id not in self._entries:
+            return 0.0
+        return interval * self._entries.index(entry_id) / len(self._entries)
+
+    def next_delay(self, entry_id, interval: float) -> float:
+        """Return the delay until the entry's next slot on the grid."""
+        now = time.time()
+        delay = interval - ((now - self.phase(entry_id, interval)) % interval)
+        # 刚好错过槽位时不要连续轮询两次
+        if delay < interval / 2:
+            delay += interval
+        self._scheduled[entry_id] = time.monotonic() + delay
+        return delay
+
+    def poll_started(self, entry_id):
+        """Record how late a poll started against its slot."""
+        scheduled = self._scheduled.get(entry_id)
+        if scheduled is not None:
+            self._lag[entry_id] = round(max(0.0, time.monotonic() - scheduled), 3)
+
+    def request_slot(self):
+        """Return an async context manager holding one global request slot."""
+        return _FleetSlot(self)
+
+    def stats(self, entry_id=None):
+        """Return fleet counters, with the lag of one entry if given."""
+        stats = dict(self._stats)
+        stats["entries"] = len(self._entries)
+        stats["max_concurrent"] = self._max_concurrent
+        stats["in_flight"] = self._in_flight
+        if entry_id is not None:
+            stats["lag"] = self._lag.get(entry_id)
+            stats["slot"] = self._entries.index(entry_id) if entry_id in self._entries else None
+        else:
+            stats["lag"] = dict(self._lag)
+        return stats
+
+
+class _FleetSlot:
+    __slots__ = ("_fleet",)
+
+    def __init__(self, fleet: FleetScheduler) -> None:
+        self._fleet = fleet
+
+    async def __aenter__(self):
+        fleet = self._fleet
+        fleet._stats["requests"] += 1
+        if fleet._semaphore.locked():
+            fleet._stats["waited"] += 1
+        await fleet._semaphore.acquire()
+        fleet._in_flight += 1
+        fleet._stats["max_in_flight"] = max(fleet._stats["max_in_flight"], fleet._in_flight)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._fleet._in_flight -= 1
+        self._fleet._semaphore.release()
@@ -0,0 +1,149 @@
+"""
+per-router request limiter: in-flight cap, rate limit and priority lanes
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+
+from .const import (
+    PRIORITY_POLL,
+    PRIORITY_USER,
+    ROUTER_MAX_IN_FLIGHT,
+    ROUTER_MAX_RATE,
+)
+
+LANES = {PRIORITY_USER: "user", PRIORITY_POLL: "poll"}
+
+
+class RouterLimiter:
+    """Cap concurrent requests and requests per second toward one router.
+
+    Waiters are served by priority, then in arrival order, so a switch or
+    button action never queues behind background polling.
+
+    Usage:
+        async with limiter.slot(PRIORITY_USER):
+            ...
+    """
+
+    def __init__(self, max_in_flight: int = ROUTER_MAX_IN_FLIGHT, rate: float = ROUTER_MAX_RATE) -> None:
+        self._max_in_flight = max_in_flight
+        self._rate = rate
+        self._tokens = float(rate)
+        self._refilled = time.monotonic()
+        self._in_flight = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._stats = {
+            lane: {"requests": 0, "queued": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for lane in LANES.values()
+        }
+        self._max_queue = 0
+
+    @property
+    def stats(self):
+        """Return queueing counters per lane, for diagnostics."""
+        lanes = {}
+        for lane, stats in self._stats.items():
+            lanes[lane] = {
+                "requests": stats["requests"],
+                "queued": stats["queued"],
+                "avg_wait": round(stats["wait_total"] / stats["requests"], 4) if stats["requests"] else 0.0,
+                "max_wait": round(stats["wait_max"], 4),
+            }
+        return {
+            "max_in_flight": self._max_in_flight,
+            "rate": self._rate,
+            "in_flight": self._in_flight,
+            "waiting": len(self._waiters),
+            "max_queue": self._max_queue,
+            "lanes": lanes,
+        }
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(float(self._rate), self._tokens + (now - self._refilled) * self._rate)
+        self._refilled = now
+
+    def _try_take(self) -> bool:
+        if self._in_flight >= self._max_in_flight:
+            return False
+        self._refill()
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        self._in_flight += 1
+        return True
+
+    def _wake(self):
+        """Hand free slots to the waiters in priority order."""
+        self._wakeup = None
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                # 等待者已取消
+                heapq.heappop(self._waiters)
+                continue
+            if not self._try_take():
+                break
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+        # 只缺令牌时，定时到下一个令牌生成再唤醒
+        if self._waiters and self._in_flight < self._max_in_flight and self._wakeup is None:
+            delay = (1 - self._tokens) / self._rate
+            self._wakeup = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    async def acquire(self, priority: int = PRIORITY_POLL):
+        """Wait for a slot; cancellation (e.g. the deadline) leaves the queue."""
+        started = time.monotonic()
+        stats = self._stats[LANES.get(priority, "poll")]
+        stats["requests"] += 1
+
+        if not self._waiters and self._try_take():
+            return
+
+        stats["queued"] += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._max_queue = max(self._max_queue, len(self._waiters))
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已分到名额但调用方被取消，归还名额
+                self.release()
+            else:
+                future.cancel()
+            raise
+        finally:
+            waited = time.monotonic() - started
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+
+    def release(self):
+        """Give the slot back and wake the next waiter."""
+        self._in_flight -= 1
+        self._wake()
+
+    def slot(self, priority: int = PRIORITY_POLL):
+        """Return an async context manager holding one slot."""
+        return _Slot(self, priority)
+
+
+class _Slot:
+    __slots__ = ("_limiter", "_priority")
+
+    def __init__(self, limiter: RouterLimiter, priority: int) -> None:
+        self._limiter = limiter
+        self._priority = priority
+
+    async def __aenter__(self):
+        await self._limiter.acquire(self._priority)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._limiter.release()
@@ -0,0 +1,62 @@
+"""
+coalesce refresh requests from entities into one poll
+"""
+
+import asyncio
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RefreshCoalescer:
+    """Merge refresh requests that arrive within a debounce window.
+
+    The first request opens the window; every request until the poll
+    actually starts joins it and awaits the same result. A request made
+    while a poll is running queues exactly one follow-up poll, so callers
+    always see data fetched after they asked.
+    """
+
+    def __init__(self, hass, refresh, debounce: float) -> None:
+        self._hass = hass
+        self._refresh = refresh
+        self.debounce = debounce
+        self._queued = None
+        self._lock = asyncio.Lock()
+        self._stats = {"requests": 0, "polls": 0, "avoided": 0}
+
+    @property
+    def stats(self):
+        """Return request/poll counters, for diagnostics."""
+        stats = dict(self._stats)
+        stats["debounce"] = self.debounce
+        return stats
+
+    async def async_request(self):
+        """Ask for a refresh and wait until the shared poll is done."""
+        self._stats["requests"] += 1
+        if self._queued is not None:
+            self._stats["avoided"] += 1
+            future = self._queued
+        else:
+            future = self._queued = self._hass.loop.create_future()
+            # 轮询放在后台任务里，调用方被取消不会取消别人也在等的轮询
+            self._hass.async_create_task(self._async_run(future))
+        await asyncio.shield(future)
+
+    async def _async_run(self, future):
+        try:
+            if self.debounce:
+                await asyncio.sleep(self.debounce)
+            # 上一次合并的轮询还没结束时，在它之后再跑
+            async with self._lock:
+                self._queued = None
+                self._stats["polls"] += 1
+                await self._refresh()
+        except Exception as error:  # pylint: disable=broad-except
+            _LOGGER.debug("coalesced refresh failed: %s", error)
+        finally:
+            if self._queued is future:
+                self._queued = None
+            if not future.done():
+                future.set_result(None)
@@ -0,0 +1,166 @@
+"""
+retry and hedging policy for idempotent ubus reads
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+
+from aiohttp.client_exceptions import ClientError
+
+from .const import (
+    DEFAULT_RETRY_ATTEMPTS,
+    RETRY_BACKOFF,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# 只读调用，可以安全地重试或并发发送副本
+READ_ONLY_CALLS = {
+    ("system", "info"),
+    ("system", "board"),
+    ("uci", "get"),
+    ("uci", "changes"),
+    ("network.interface", "dump"),
+    ("file", "read"),
+    ("luci", "getCPUInfo"),
+    ("luci", "getCPUUsage"),
+    ("luci", "getTempInfo"),
+    ("luci", "getOnlineUsers"),
+    ("luci", "getRealtimeStats"),
+    ("luci-rpc", "getNetworkDevices"),
+    ("session", "access"),
+}
+
+# 每种请求保留的延迟样本数，及开始对冲前需要的最少样本数
+LATENCY_SAMPLES = 50
+HEDGE_MIN_SAMPLES = 10
+
+
+def is_idempotent(calls) -> bool:
+    """Return True if every call (of a batch or list) is a read."""
+    calls = list(calls)
+    return len(calls) > 0 and all((call.object, call.method) in READ_ONLY_CALLS for call in calls)
+
+
+def _is_retryable(result) -> bool:
+    # 5xx 说明 uhttpd/rpcd 暂时忙不过来；401/403 等交给调用方处理
+    return isinstance(result, int) and result >= 500
+
+
+class RetryPolicy:
+    """Retry read-only requests with jittered backoff and hedge slow ones.
+
+    Once a request of some kind has been running longer than the p95 of its
+    recent latencies, a duplicate is sent and whichever answers first wins.
+    Everything stays within the caller's deadline.
+    """
+
+    def __init__(self, attempts: int = DEFAULT_RETRY_ATTEMPTS, hedge: bool = True, backoff: float = RETRY_BACKOFF) -> None:
+        self._attempts = max(1, attempts)
+        self._hedge = hedge
+        self._backoff = backoff
+        self._latencies = {}
+        self._stats = {
+            "retries": 0,
+            "hedges_sent": 0,
+            "hedges_won": 0,
+            "gave_up": 0,
+        }
+
+    @property
+    def stats(self):
+        """Return retry/hedge counters and observed p95 per request kind."""
+        stats = dict(self._stats)
+        stats["attempts"] = self._attempts
+        stats["hedge"] = self._hedge
+        stats["p95"] = {kind: round(self.p95(kind), 4) for kind in self._latencies if self.p95(kind) is not None}
+        return stats
+
+    def p95(self, kind):
+        """Return the observed p95 latency of a request kind, None until enough samples."""
+        samples = self._latencies.get(kind)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def _record(self, kind, elapsed):
+        self._latencies.setdefault(kind, deque(maxlen=LATENCY_SAMPLES)).append(elapsed)
+
+    async def _timed(self, request, kind):
+        started = time.monotonic()
+        result = await request()
+        if not _is_retryable(result):
+            self._record(kind, time.monotonic() - started)
+        return result
+
+    async def _attempt(self, request, deadline, kind):
+        """Run one attempt, hedging it once it passes the p95 latency."""
+        threshold = self.p95(kind) if self._hedge else None
+        if threshold is None or threshold >= deadline.remaining():
+            return await self._timed(request, kind)
+
+        primary = asyncio.ensure_future(self._timed(request, kind))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=threshold)
+            if done:
+                return primary.result()
+
+            self._stats["hedges_sent"] += 1
+            _LOGGER.debug("%s request slower than p95 %.3fs, sending hedged duplicate", kind, threshold)
+            hedged = asyncio.ensure_future(self._timed(request, kind))
+            pending.add(hedged)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if task is hedged:
+                        self._stats["hedges_won"] += 1
+                    return task.result()
+            raise error
+        finally:
+            # 取消没跑完的另一份请求，连同 deadline 超时时的两份
+            for task in pending:
+                task.cancel()
+
+    async def run(self, request, deadline, kind):
+        """Call request() until it succeeds, is not retryable or time runs out.
+
+        request must be a read: it may be sent more than once.
+        """
+        result = None
+        error = None
+        for attempt in range(self._attempts):
+            if attempt:
+                # full jitter 退避，避免多个请求同时重试
+                delay = random.uniform(0, self._backoff * (2 ** attempt))
+                if delay >= deadline.remaining():
+                    break
+                self._stats["retries"] += 1
+                _LOGGER.debug("%s request failed (%s), retry in %.3fs", kind, error or result, delay)
+                await asyncio.sleep(delay)
+
+            try:
+                result = await self._attempt(request, deadline, kind)
+                error = None
+            except (ClientError, asyncio.TimeoutError) as err:
+                result = None
+                error = err
+                if deadline.expired:
+                    break
+                continue
+
+            if not _is_retryable(result):
+                return result
+
+        self._stats["gave_up"] += 1
+        if error is not None:
+            raise error
+        return result
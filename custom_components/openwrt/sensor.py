@@ -1,10 +1,13 @@
 """OPENWRT Entities"""
 import logging
+from homeassistant.components.sensor import SensorDeviceClass, SensorEntity
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.core import HomeAssistant
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import MATCH_ALL, EntityCategory
+from homeassistant.util import dt as dt_util
 
-from .const import COORDINATOR, DOMAIN, SENSOR_TYPES
+from .const import COORDINATOR, DOMAIN, FETCHER, SENSOR_TYPES
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -13,17 +16,22 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
     """Add bjtoon_health_code entities from a config_entry."""
 
     coordinator = hass.data[DOMAIN][config_entry.entry_id][COORDINATOR]
+    capabilities = hass.data[DOMAIN][config_entry.entry_id][FETCHER].capabilities
 
     sensors = []
     for sensor in SENSOR_TYPES:
-        sensors.append(OPENWRTSensor(sensor, coordinator))
+        # 路由器不支持的数据源不创建传感器
+        if capabilities.supports(SENSOR_TYPES[sensor].get("requires")):
+            sensors.append(OPENWRTSensor(sensor, coordinator))
 
     async_add_entities(sensors, False)
 
 
-class OPENWRTSensor(CoordinatorEntity):
+class OPENWRTSensor(CoordinatorEntity, SensorEntity):
     """Define an bjtoon_health_code entity."""
     _attr_has_entity_name = True
+    # 属性（wan 配置、内存明细）体积大且与传感器值重复，不写入 recorder
+    _unrecorded_attributes = frozenset({MATCH_ALL})
 
     def __init__(self, kind, coordinator) -> None:
         """Initialize."""
@@ -61,16 +69,25 @@ class OPENWRTSensor(CoordinatorEntity):
     @property
     def available(self):
         """Return True if entity is available."""
-        return self.coordinator.last_update_success
+        # 提取失败的键只让对应的传感器不可用
+        data = self.coordinator.data or {}
+        return self.coordinator.last_update_success and self.kind not in data.get("unavailable", ())
 
     @property
-    def state(self):
+    def native_value(self):
         """Return the state."""
         # 检查coordinator.data是否为None，避免NoneType错误
         if self.coordinator.data is None:
             return None
         # 使用get方法安全获取数据，不存在时返回None
-        return self.coordinator.data.get(self.kind)
+        value = self.coordinator.data.get(self.kind)
+        if self.device_class == SensorDeviceClass.TIMESTAMP:
+            # 快照中保存 epoch 秒；旧版本保存的字符串（时长、querytime）视为未知
+            return dt_util.utc_from_timestamp(value) if isinstance(value, (int, float)) else None
+        if self.state_class and not isinstance(value, (int, float)):
+            # 旧版本快照中按单位换算后的字符串不能作为统计值
+            return None
+        return value
 
     @property
     def icon(self):
@@ -78,11 +95,29 @@ class OPENWRTSensor(CoordinatorEntity):
         return SENSOR_TYPES[self.kind]["icon"]
 
     @property
-    def unit_of_measurement(self):
+    def native_unit_of_measurement(self):
         """Return the unit_of_measurement."""
         if SENSOR_TYPES[self.kind].get("unit_of_measurement"):
             return SENSOR_TYPES[self.kind]["unit_of_measurement"]
 
+    @property
+    def suggested_unit_of_measurement(self):
+        """Return the unit the value is shown in by default."""
+        if SENSOR_TYPES[self.kind].get("suggested_unit_of_measurement"):
+            return SENSOR_TYPES[self.kind]["suggested_unit_of_measurement"]
+
+    @property
+    def state_class(self):
+        """Return the state class, for long-term statistics."""
+        if SENSOR_TYPES[self.kind].get("state_class"):
+            return SENSOR_TYPES[self.kind]["state_class"]
+
+    @property
+    def entity_category(self):
+        """Return the entity category."""
+        if SENSOR_TYPES[self.kind].get("entity_category"):
+            return EntityCategory(SENSOR_TYPES[self.kind]["entity_category"])
+
     @property
     def device_class(self):
         """Return the unit_of_measurement."""
@@ -90,23 +125,19 @@ class OPENWRTSensor(CoordinatorEntity):
             return SENSOR_TYPES[self.kind]["device_class"]
 
     @property
-    def state_attributes(self):
-        attrs = {}
+    def extra_state_attributes(self):
         data = self.coordinator.data  # 先获取数据引用
-        # 检查数据是否为None，避免空指针错误
-        if data is not None:
-            # 安全获取属性数据
-            if data.get(self.kind + "_attrs"):
-                attrs = data[self.kind + "_attrs"]
-            # 安全获取querytime（即使不存在也不会报错）
-            if "querytime" in data:
-                attrs["querytime"] = data["querytime"]
-        return attrs
+        # 检查数据是否为None，避免空指针错误；querytime 每次轮询都变，不作为属性
+        if data is not None and data.get(self.kind + "_attrs"):
+            # 快照中的属性只读且与协调器共享，复制一份交给 HA
+            return dict(data[self.kind + "_attrs"])
+        return None
 
     async def async_added_to_hass(self):
         """Connect to dispatcher listening for entity data notifications."""
+        # 只有自己的值或属性变化时才写状态
         self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
+            self.coordinator.async_add_key_listener((self.kind, self.kind + "_attrs", "unavailable"), self.async_write_ha_state)
         )
 
     async def async_update(self):
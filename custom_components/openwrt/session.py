@@ -0,0 +1,174 @@
+"""
+rpcd session manager: cheap validity probes and background renewal
+"""
+
+import asyncio
+import logging
+import time
+
+from .const import (
+    AUTH_BACKOFF_MAX,
+    AUTH_BACKOFF_MIN,
+    SESSION_PROBE_INTERVAL,
+    SESSION_RENEW_AGE,
+)
+from .transport import Deadline
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class LoginRejected(Exception):
+    """The router rejected the username or password."""
+
+
+class SessionManager:
+    """Keep one valid sysauth session for a router.
+
+    A background task probes the session every SESSION_PROBE_INTERVAL
+    seconds with a cheap call, and logs in again before LuCI's session
+    lifetime runs out or as soon as a probe or a 401 shows the session is
+    gone. Foreground callers only wait for a login when there is no valid
+    session at all. A rejected login backs off exponentially instead of
+    disabling the integration for good.
+
+    login(deadline) returns the new session id, None on a transient error,
+    or raises LoginRejected. probe(sid, deadline) returns True/False, or
+    None when the router could not answer.
+    """
+
+    def __init__(self, hass, login, probe) -> None:
+        self._hass = hass
+        self._login = login
+        self._probe = probe
+        self._sid = None
+        self._valid = False
+        self._obtained = 0.0
+        self._lock = asyncio.Lock()
+        self._renew_task = None
+        self._probe_task = None
+        self._backoff = AUTH_BACKOFF_MIN
+        self._blocked_until = 0.0
+        self._stats = {
+            "logins": 0,
+            "background_renewals": 0,
+            "probes": 0,
+            "probe_invalid": 0,
+            "auth_failures": 0,
+        }
+
+    @property
+    def sid(self):
+        """Return the current session id, may be stale."""
+        return self._sid
+
+    @property
+    def blocked(self) -> bool:
+        """Return True while backing off after a rejected login."""
+        return time.monotonic() < self._blocked_until
+
+    @property
+    def stats(self):
+        """Return session counters, for diagnostics."""
+        stats = dict(self._stats)
+        stats["valid"] = self._valid
+        stats["age"] = round(time.monotonic() - self._obtained) if self._sid else None
+        stats["blocked_for"] = round(max(0.0, self._blocked_until - time.monotonic()))
+        return stats
+
+    async def async_get(self, deadline: Deadline = None):
+        """Return a valid session id, or None if none can be had right now."""
+        if self._valid:
+            if time.monotonic() - self._obtained > SESSION_RENEW_AGE:
+                # 快到期了：后台续期，当前请求继续用旧的会话
+                self._schedule_renew()
+            return self._sid
+
+        if self.blocked:
+            return None
+
+        renew = self._renew_task
+        if renew is not None and not renew.done():
+            # 后台正在登录，等它的结果，不另起一次登录
+            await asyncio.shield(renew)
+            return self._sid if self._valid else None
+
+        return await self._async_login(deadline)
+
+    def invalidate(self):
+        """Mark the session as gone (e.g. after a 401) and renew in the background."""
+        self._valid = False
+        self._schedule_renew()
+
+    def _schedule_renew(self):
+        if self.blocked or (self._renew_task is not None and not self._renew_task.done()):
+            return
+        self._renew_task = self._hass.async_create_background_task(
+            self._async_renew(), "openwrt session renew"
+        )
+
+    async def _async_renew(self):
+        self._stats["background_renewals"] += 1
+        try:
+            await self._async_login(Deadline())
+        except Exception as error:  # pylint: disable=broad-except
+            _LOGGER.debug("background session renewal failed: %s", error)
+
+    async def _async_login(self, deadline):
+        async with self._lock:
+            # 等锁期间可能已经由其他调用者登录成功（续期时旧会话仍然有效，不能据此跳过）
+            renewing = time.monotonic() - self._obtained > SESSION_RENEW_AGE
+            if self._valid and not renewing:
+                return self._sid
+            if self.blocked:
+                return None
+
+            self._stats["logins"] += 1
+            try:
+                sid = await self._login(deadline)
+            except LoginRejected:
+                self._stats["auth_failures"] += 1
+                self._valid = False
+                self._blocked_until = time.monotonic() + self._backoff
+                _LOGGER.error("OpenWrt rejected the login, retrying in %ds", self._backoff)
+                self._backoff = min(self._backoff * 2, AUTH_BACKOFF_MAX)
+                return None
+
+            if sid is None:
+                return self._sid if self._valid else None
+
+            self._sid = sid
+            self._valid = True
+            self._obtained = time.monotonic()
+            self._backoff = AUTH_BACKOFF_MIN
+            self._start_probing()
+            return sid
+
+    def _start_probing(self):
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = self._hass.async_create_background_task(
+                self._async_probe_loop(), "openwrt session probe"
+            )
+
+    async def _async_probe_loop(self):
+        while True:
+            await asyncio.sleep(SESSION_PROBE_INTERVAL)
+            if not self._valid:
+                continue
+            self._stats["probes"] += 1
+            try:
+                valid = await self._probe(self._sid, Deadline())
+            except Exception as error:  # pylint: disable=broad-except
+                _LOGGER.debug("session probe failed: %s", error)
+                continue
+            if valid is False:
+                self._stats["probe_invalid"] += 1
+                _LOGGER.debug("session expired on the router, renewing in the background")
+                self.invalidate()
+            elif time.monotonic() - self._obtained > SESSION_RENEW_AGE:
+                self._schedule_renew()
+
+    def stop(self):
+        """Cancel background probing and renewal, on unload."""
+        for task in (self._probe_task, self._renew_task):
+            if task is not None and not task.done():
+                task.cancel()
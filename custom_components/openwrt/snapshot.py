@@ -0,0 +1,261 @@
+"""
+immutable snapshot of one router, shared by the coordinator and every entity
+
+A snapshot is a set of small __slots__ records, one per section (board,
+memory, wan...). A poll only builds records for sections whose values
+changed; every other section is the same object as in the previous snapshot,
+so unchanged data is neither copied nor rebuilt. Entities read it through
+the Mapping interface with the same keys as before ("openwrt_cpu", ...).
+"""
+
+from collections.abc import Mapping
+from types import MappingProxyType
+
+
+def _freeze(value):
+    """Return a read-only view of dict/list values, other values unchanged."""
+    if isinstance(value, dict):
+        return MappingProxyType(value)
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value):
+    """Return plain dict/list values, for storage and diagnostics."""
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+class Record:
+    """Immutable record; subclasses list their fields in __slots__, None means missing."""
+
+    __slots__ = ()
+
+    def __init__(self, values: dict = None) -> None:
+        values = values or {}
+        for name in self.__slots__:
+            object.__setattr__(self, name, values.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.as_dict()})"
+
+    def replace(self, values: dict):
+        """Return a new record with the (already frozen) values applied."""
+        record = object.__new__(type(self))
+        for name in self.__slots__:
+            object.__setattr__(record, name, values[name] if name in values else getattr(self, name))
+        return record
+
+    def as_dict(self):
+        """Return the fields that are set."""
+        return {name: getattr(self, name) for name in self.__slots__ if getattr(self, name) is not None}
+
+
+class BoardInfo(Record):
+    """Device info from `system board`."""
+
+    __slots__ = ("sw_version", "device_name", "model")
+
+
+class SystemStatus(Record):
+    """Uptime, load, cpu and counters that change every poll."""
+
+    __slots__ = (
+        "openwrt_uptime",
+        "openwrt_load",
+        "openwrt_cpu",
+        "openwrt_cputemp",
+        "openwrt_conncount",
+        "openwrt_user_online",
+    )
+
+
+class MemoryInfo(Record):
+    """Memory figures from `system info`."""
+
+    __slots__ = (
+        "openwrt_memory",
+        "openwrt_memory_attrs",
+        "openwrt_memory_total",
+        "openwrt_memory_free",
+        "openwrt_memory_shared",
+        "openwrt_memory_buffered",
+        "openwrt_memory_available",
+        "openwrt_memory_cached",
+    )
+
+
+class WanInfo(Record):
+    """WAN and WAN6 addresses and uptime."""
+
+    __slots__ = (
+        "openwrt_wan_ip",
+        "openwrt_wan_ip_attrs",
+        "openwrt_wan_uptime",
+        "openwrt_wan6_ip",
+        "openwrt_wan6_ip_attrs",
+        "openwrt_wan6_uptime",
+    )
+
+
+class TrafficInfo(Record):
+    """br-lan byte counters (B) and rates (B/s)."""
+
+    __slots__ = ("openwrt_rx", "openwrt_tx", "openwrt_rx_packets", "openwrt_tx_packets")
+
+
+class PasswallInfo(Record):
+    """Passwall exit address."""
+
+    __slots__ = ("openwrt_passwall_ip", "openwrt_passwall_country")
+
+
+class SwitchStates(Record):
+    """Switch states, a tuple of {"name", "onoff"}."""
+
+    __slots__ = ("switch",)
+
+
+class PollInfo(Record):
+    """Freshness of the snapshot; unavailable lists the keys whose extractor failed."""
+
+    __slots__ = ("openwrt_isold", "querytime", "openwrt_poll_interval", "unavailable")
+
+
+class Snapshot(Mapping):
+    """Immutable router data: one record per section, read like a dict."""
+
+    SECTIONS = {
+        "board": BoardInfo,
+        "system": SystemStatus,
+        "memory": MemoryInfo,
+        "wan": WanInfo,
+        "traffic": TrafficInfo,
+        "passwall": PasswallInfo,
+        "switches": SwitchStates,
+        "poll": PollInfo,
+    }
+    __slots__ = tuple(SECTIONS)
+
+    # 键 -> 所属分区
+    KEY_SECTION = {key: name for name, record in SECTIONS.items() for key in record.__slots__}
+
+    def __init__(self, sections: dict = None) -> None:
+        sections = sections or {}
+        for name, record in self.SECTIONS.items():
+            section = sections.get(name)
+            object.__setattr__(self, name, record() if section is None else section)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Snapshot is immutable")
+
+    def __getitem__(self, key):
+        section = self.KEY_SECTION.get(key)
+        if section is None:
+            raise KeyError(key)
+        value = getattr(getattr(self, section), key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        for name in self.__slots__:
+            record = getattr(self, name)
+            for key in record.__slots__:
+                if getattr(record, key) is not None:
+                    yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __bool__(self):
+        # Mapping 默认用 __len__ 判断真假，要遍历所有字段
+        return next(iter(self), None) is not None
+
+    def __eq__(self, other):
+        if not isinstance(other, Snapshot):
+            return Mapping.__eq__(self, other)
+        # 共享的分区按对象比较，不必逐字段比较
+        return all(
+            getattr(self, name) is getattr(other, name) or getattr(self, name) == getattr(other, name)
+            for name in self.__slots__
+        )
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Snapshot({dict(self)})"
+
+    def evolve(self, values: dict):
+        """Return a snapshot with the values applied; unchanged sections are shared.
+
+        Returns self when no value changed.
+        """
+        changes = None
+        key_section = self.KEY_SECTION
+        for key, value in values.items():
+            name = key_section[key]
+            if value.__class__ is list:
+                value = _freeze(value)
+            # dict 与只读视图可以直接比较，没变化时不必创建视图
+            if getattr(getattr(self, name), key) != value:
+                if value.__class__ is dict:
+                    value = MappingProxyType(value)
+                if changes is None:
+                    changes = {}
+                changes.setdefault(name, {})[key] = value
+        if changes is None:
+            return self
+
+        sections = {name: getattr(self, name) for name in self.__slots__}
+        for name, section_values in changes.items():
+            sections[name] = sections[name].replace(section_values)
+        return Snapshot(sections)
+
+    def changed_keys(self, other) -> set:
+        """Return the keys whose value differs from the other snapshot."""
+        if not isinstance(other, Snapshot):
+            return set(self) | set(other or ())
+        changed = set()
+        for name in self.__slots__:
+            record = getattr(self, name)
+            previous = getattr(other, name)
+            # 共享的分区一定没有变化
+            if record is previous:
+                continue
+            for key in record.__slots__:
+                if getattr(record, key) != getattr(previous, key):
+                    changed.add(key)
+        return changed
+
+    def shared_sections(self, other) -> int:
+        """Return how many sections are the same object in both snapshots."""
+        if not isinstance(other, Snapshot):
+            return 0
+        return sum(1 for name in self.__slots__ if getattr(self, name) is getattr(other, name))
+
+    def as_dict(self):
+        """Return a plain, json-serialisable dict."""
+        return {key: _thaw(self[key]) for key in self}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Build a snapshot from as_dict() output, ignoring unknown keys."""
+        return EMPTY_SNAPSHOT.evolve({key: value for key, value in data.items() if key in cls.KEY_SECTION})
+
+
+EMPTY_SNAPSHOT = Snapshot()
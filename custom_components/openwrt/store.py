@@ -0,0 +1,76 @@
+"""
+persist the last good snapshot and the capabilities of a router across restarts
+"""
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .capabilities import Capabilities
+from .snapshot import Snapshot
+from .const import (
+    CAPABILITY_STORAGE_VERSION,
+    DOMAIN,
+    SNAPSHOT_SAVE_DELAY,
+    SNAPSHOT_STORAGE_VERSION,
+)
+
+# 运行时才有意义的字段，不保存
+TRANSIENT_KEYS = {"openwrt_isold", "openwrt_poll_interval"}
+
+
+class SnapshotStore:
+    """Save the last good coordinator data of one entry in .storage.
+
+    Saves are debounced, so a poll every few seconds writes the file at
+    most once per SNAPSHOT_SAVE_DELAY; pending data is flushed on shutdown.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        self._store = Store(hass, SNAPSHOT_STORAGE_VERSION, f"{DOMAIN}.{entry_id}.snapshot")
+        self._snapshot = None
+
+    async def async_load(self):
+        """Return the saved snapshot marked as old, or None."""
+        stored = await self._store.async_load()
+        if not stored or not stored.get("data"):
+            return None
+        # querytime 保留上次成功轮询的时间，即数据的真实时间
+        return Snapshot.from_dict(stored["data"]).evolve({"openwrt_isold": True})
+
+    def async_save(self, snapshot: Snapshot):
+        """Schedule a debounced save of a good snapshot."""
+        # 快照不可变，保存时才转换成 dict
+        self._snapshot = snapshot
+        self._store.async_delay_save(self._data_to_save, SNAPSHOT_SAVE_DELAY)
+
+    def _data_to_save(self):
+        data = self._snapshot.as_dict()
+        for key in TRANSIENT_KEYS:
+            data.pop(key, None)
+        return {"data": data}
+
+    async def async_remove(self):
+        """Delete the file when the entry is removed."""
+        await self._store.async_remove()
+
+
+class CapabilityStore:
+    """Save the probed capabilities of one entry, valid for one firmware."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        self._store = Store(hass, CAPABILITY_STORAGE_VERSION, f"{DOMAIN}.{entry_id}.capabilities")
+
+    async def async_load(self):
+        """Return the saved Capabilities, or None."""
+        stored = await self._store.async_load()
+        if not stored:
+            return None
+        return Capabilities.from_dict(stored)
+
+    async def async_save(self, capabilities: Capabilities):
+        """Save capabilities right away; probes are rare."""
+        await self._store.async_save(capabilities.as_dict())
+
+    async def async_remove(self):
+        """Delete the file when the entry is removed."""
+        await self._store.async_remove()
@@ -0,0 +1,172 @@
+"""
+persistent keep-alive http transport toward one openwrt router
+"""
+
+import asyncio
+import logging
+import ssl
+import time
+
+import aiohttp
+from async_timeout import timeout
+from homeassistant.util.ssl import get_default_no_verify_context
+
+from .const import (
+    KEEPALIVE_TIMEOUT,
+    PRIORITY_POLL,
+    REQUEST_TIMEOUT,
+    ROUTER_CONNECTION_LIMIT,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def parse_fingerprint(value):
+    """Return the sha256 certificate pin as bytes, or None if not set.
+
+    Accepts hex with or without ':' separators, raises ValueError otherwise.
+    """
+    if not value:
+        return None
+    digest = bytes.fromhex(value.replace(":", "").strip())
+    if len(digest) != 32:
+        raise ValueError("sha256 fingerprint must be 32 bytes")
+    return digest
+
+
+class Deadline:
+    """Time budget shared by every request of one poll or user action.
+
+    Sub-requests get whatever time is left instead of a fresh timeout each.
+    The priority decides which lane of the router limiter they queue in.
+    """
+
+    def __init__(self, budget: float = REQUEST_TIMEOUT, priority: int = PRIORITY_POLL) -> None:
+        self.budget = budget
+        self.priority = priority
+        self._expires = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        """Return the seconds left, never negative."""
+        return max(0.0, self._expires - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        """Return True once the budget is used up."""
+        return self.remaining() <= 0
+
+    def timeout(self):
+        """Return a timeout context manager for the remaining budget."""
+        return timeout(self.remaining())
+
+
+class RouterTransport:
+    """Keep-alive connection pool toward one router.
+
+    uhttpd closes idle connections after 20s by default, so the pool keeps
+    them a bit shorter and every poll within that window reuses the same
+    TCP connection (and TLS handshake on https hosts) instead of opening a
+    new one per request.
+    """
+
+    def __init__(self, host: str, ssl_fingerprint: str = None) -> None:
+        self._host = host
+        self._session = None
+        self._ssl = self._build_ssl(ssl_fingerprint)
+        self.stats = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "bytes_received": 0,
+            "compressed_responses": 0,
+        }
+
+    def _build_ssl(self, ssl_fingerprint):
+        if not self._host.startswith("https"):
+            return False
+
+        fingerprint = parse_fingerprint(ssl_fingerprint)
+        if fingerprint is not None:
+            # 证书固定：不校验证书链，但要求证书指纹一致
+            return aiohttp.Fingerprint(fingerprint)
+
+        # 路由器一般是自签名证书，与之前 verify=False 行为一致；
+        # 使用 HA 缓存的不校验 SSLContext，不在事件循环中加载系统 CA 证书
+        return get_default_no_verify_context()
+
+    async def _on_request_start(self, session, context, params):
+        self.stats["requests"] += 1
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.stats["connections_created"] += 1
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        self.stats["connections_reused"] += 1
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Return the pooled session, creating it on first use."""
+        if self._session is None or self._session.closed:
+            trace = aiohttp.TraceConfig()
+            trace.on_request_start.append(self._on_request_start)
+            trace.on_connection_create_end.append(self._on_connection_create_end)
+            trace.on_connection_reuseconn.append(self._on_connection_reuseconn)
+
+            connector = aiohttp.TCPConnector(
+                limit_per_host=ROUTER_CONNECTION_LIMIT,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ssl=self._ssl,
+            )
+            # 登录跳转需要带上 sysauth cookie；会话只访问这一台路由器，允许 IP 主机的 cookie
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                cookie_jar=aiohttp.CookieJar(unsafe=True),
+                trace_configs=[trace],
+                # 支持压缩的 uhttpd 会返回 gzip，aiohttp 自动解压
+                headers={"Accept-Encoding": "gzip, deflate"},
+            )
+        return self._session
+
+    @property
+    def connection_stats(self):
+        """Return request and connection reuse counters."""
+        stats = dict(self.stats)
+        created = stats["connections_created"]
+        reused = stats["connections_reused"]
+        stats["reuse_ratio"] = round(reused / (created + reused), 3) if created + reused else 0.0
+        if isinstance(self._ssl, ssl.SSLContext):
+            stats["tls_session_stats"] = self._ssl.session_stats()
+        return stats
+
+    async def async_request(self, method, url, headers=None, deadline: Deadline = None, **kwargs):
+        """Send a request on the pool, return (status, body bytes).
+
+        The aiohttp timeout is set to what is left of the deadline, so an
+        overrun request is aborted and its socket closed.
+        """
+        if deadline is None:
+            deadline = Deadline()
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            raise asyncio.TimeoutError
+
+        client_timeout = aiohttp.ClientTimeout(total=remaining)
+        async with self.session.request(method, url, headers=headers, timeout=client_timeout, **kwargs) as response:
+            body = await response.read()
+            self.stats["bytes_received"] += len(body)
+            if response.headers.get("Content-Encoding") in ("gzip", "deflate"):
+                self.stats["compressed_responses"] += 1
+            return response.status, body
+
+    def stream(self, url, headers=None):
+        """Return the response context of a long-lived GET (event stream).
+
+        Only connecting is bounded; the stream itself may stay open forever.
+        """
+        client_timeout = aiohttp.ClientTimeout(total=None, connect=REQUEST_TIMEOUT)
+        return self.session.get(url, headers=headers, timeout=client_timeout)
+
+    async def async_close(self):
+        """Close the pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -0,0 +1,140 @@
+"""
+typed ubus json-rpc batch for the openwrt /ubus/ endpoint
+"""
+
+from .codec import get_codec
+
+# ubus 状态码，见 libubus ubus_msg_status
+UBUS_STATUS_OK = 0
+UBUS_STATUS_INVALID_COMMAND = 1
+UBUS_STATUS_INVALID_ARGUMENT = 2
+UBUS_STATUS_METHOD_NOT_FOUND = 3
+UBUS_STATUS_NOT_FOUND = 4
+UBUS_STATUS_NO_DATA = 5
+UBUS_STATUS_PERMISSION_DENIED = 6
+UBUS_STATUS_TIMEOUT = 7
+UBUS_STATUS_NOT_SUPPORTED = 8
+UBUS_STATUS_UNKNOWN_ERROR = 9
+UBUS_STATUS_CONNECTION_FAILED = 10
+
+# uhttpd-mod-ubus json-rpc 错误码对应的 ubus 状态
+JSONRPC_ERROR_STATUS = {
+    -32700: UBUS_STATUS_INVALID_COMMAND,      # parse error
+    -32600: UBUS_STATUS_INVALID_COMMAND,      # invalid request
+    -32601: UBUS_STATUS_METHOD_NOT_FOUND,     # method not found
+    -32602: UBUS_STATUS_INVALID_ARGUMENT,     # invalid params
+    -32000: UBUS_STATUS_NOT_FOUND,            # object not found
+    -32002: UBUS_STATUS_PERMISSION_DENIED,    # access denied
+}
+
+
+class UbusCall:
+    """One (object, method, params) call inside a batch."""
+
+    __slots__ = ("id", "object", "method", "params")
+
+    def __init__(self, call_id: int, obj: str, method: str, params: dict = None) -> None:
+        self.id = call_id
+        self.object = obj
+        self.method = method
+        self.params = params or {}
+
+    def __repr__(self):
+        return f"UbusCall({self.object} {self.method} {self.params})"
+
+
+class UbusResult:
+    """Result of one call: ubus status code plus the returned data."""
+
+    __slots__ = ("status", "data", "error")
+
+    def __init__(self, status: int, data=None, error: str = None) -> None:
+        self.status = status
+        self.data = data if data is not None else {}
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        """Return True if the call succeeded."""
+        return self.status == UBUS_STATUS_OK
+
+    def __repr__(self):
+        return f"UbusResult({self.status}, {self.error or self.data})"
+
+    @classmethod
+    def from_response(cls, response):
+        """Build a result from one json-rpc response object."""
+        if not isinstance(response, dict):
+            return cls(UBUS_STATUS_UNKNOWN_ERROR, error="invalid response")
+
+        if "error" in response:
+            error = response["error"] or {}
+            status = JSONRPC_ERROR_STATUS.get(error.get("code"), UBUS_STATUS_UNKNOWN_ERROR)
+            return cls(status, error=error.get("message"))
+
+        result = response.get("result")
+        if not isinstance(result, list) or not result:
+            return cls(UBUS_STATUS_UNKNOWN_ERROR, error="invalid result")
+
+        data = result[1] if len(result) > 1 else None
+        return cls(result[0], data)
+
+
+class UbusBatch:
+    """Collect ubus calls and send them as one json-rpc POST to UBUS_URL.
+
+    Usage:
+        batch = UbusBatch()
+        info = batch.add("system", "info")
+        results = await fetcher.async_call_batch(batch, sysauth)
+        results[info].data["uptime"]
+    """
+
+    def __init__(self) -> None:
+        self._calls = []
+
+    def __len__(self):
+        return len(self._calls)
+
+    def __iter__(self):
+        return iter(self._calls)
+
+    def add(self, obj: str, method: str, params: dict = None) -> UbusCall:
+        """Add a call and return its handle, used as key into the results."""
+        call = UbusCall(len(self._calls) + 1, obj, method, params)
+        self._calls.append(call)
+        return call
+
+    def payload(self, session: str, codec=None, calls=None) -> bytes:
+        """Serialise every call (or only the given ones) with the session spliced in."""
+        codec = codec or get_codec()
+        return codec.dumps(
+            [
+                {
+                    "jsonrpc": "2.0",
+                    "id": call.id,
+                    "method": "call",
+                    "params": [session, call.object, call.method, call.params],
+                }
+                for call in (self._calls if calls is None else calls)
+            ]
+        )
+
+    def parse(self, responses, calls=None) -> dict:
+        """Demultiplex the json-rpc responses into {call: UbusResult}."""
+        if isinstance(responses, dict):
+            responses = [responses]
+
+        by_id = {}
+        for response in responses or []:
+            if isinstance(response, dict):
+                by_id[response.get("id")] = response
+
+        results = {}
+        for call in (self._calls if calls is None else calls):
+            response = by_id.get(call.id)
+            if response is None:
+                results[call] = UbusResult(UBUS_STATUS_NO_DATA, error="missing response")
+            else:
+                results[call] = UbusResult.from_response(response)
+        return results